@@ -0,0 +1,47 @@
+# bench/fake_yfinance.py
+# Substituto do yfinance para o benchmark: mesma interface usada pelos
+# processors (Ticker(...).info e download(...)), mas falando com o stub local.
+import requests
+
+BASE_URL = None
+_session = requests.Session()
+
+
+def _get(path, **params):
+    r = _session.get(f"{BASE_URL}/yahoo/{path}", params=params, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+
+class Ticker:
+    def __init__(self, symbol, session=None):
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        return _get(f"info/{self.symbol}")
+
+    def history(self, period="1d", start=None, end=None, **kwargs):
+        df = download([self.symbol], period=period, start=start, end=end)
+        return df[self.symbol] if self.symbol in df.columns.get_level_values(0) else df.iloc[0:0]
+
+
+def download(tickers, period=None, start=None, end=None, group_by="ticker", **kwargs):
+    import pandas as pd
+
+    if isinstance(tickers, str):
+        tickers = tickers.split()
+    params = {"symbols": ",".join(tickers)}
+    if start:
+        params.update(start=str(start), end=str(end))
+    dados = _get("chart", **params)
+
+    frames = {}
+    for simbolo, linhas in dados.items():
+        idx = pd.DatetimeIndex([l[0] for l in linhas])
+        frames[simbolo] = pd.DataFrame(
+            [l[1:] for l in linhas], index=idx, columns=["Open", "High", "Low", "Close", "Volume"]
+        )
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)
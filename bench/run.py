@@ -0,0 +1,218 @@
+# bench/run.py
+# Benchmark offline dos processors contra upstreams simulados (bench/stubs.py)
+# e um SQLite local no lugar do Neon. Nada sai da máquina.
+#
+# Uso:
+#   python -m bench.run                                   # todos, 100 e 1000 símbolos
+#   python -m bench.run --processors acoes,bdr --sizes 100,1000,10000
+#   python -m bench.run --latency 0.2 --error-rate 0.02 --dead-rate 0.05 --json bench.json
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+PROCESSORS = ["fiis", "acoes", "bdr", "etf", "cripto"]
+TICKER_TABLES = {
+    "fiis": ("tickers_fiis", "FI{:05d}11"),
+    "acoes": ("tickers_acoes", "AC{:05d}3"),
+    "bdr": ("tickers_bdr", "BD{:05d}34"),
+    "etf": ("tickers_etf", "ET{:05d}11"),
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark offline do coletor")
+    p.add_argument("--processors", default=",".join(PROCESSORS))
+    p.add_argument("--sizes", default="100,1000", help="tamanhos de universo, ex.: 100,1000,10000")
+    p.add_argument("--latency", type=float, default=0.05, help="latência do stub (s)")
+    p.add_argument("--jitter", type=float, default=0.5, help="variação relativa da latência")
+    p.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 503")
+    p.add_argument("--capacity", type=int, default=0, help="requisições simultâneas por stub antes do 429")
+    p.add_argument("--dead-rate", type=float, default=0.0, help="fração de tickers sem dados")
+    p.add_argument("--workers", type=int, default=16, help="FETCH_WORKERS")
+    p.add_argument("--rate", type=float, default=1e9, help="req/s por host (padrão: sem limite)")
+    p.add_argument("--json", help="grava os resultados neste arquivo")
+    return p.parse_args(argv)
+
+
+# -------------------------
+# Ambiente: stubs no lugar dos upstreams, antes de importar os módulos
+# -------------------------
+def install_stubs(args):
+    from bench import fake_yfinance
+    from bench.stubs import StubConfig, start_stub
+
+    config = StubConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, capacity=args.capacity,
+    )
+    server, base = start_stub(config)
+
+    os.environ["BRAPI_URL"] = f"{base}/brapi/api/quote/"
+    os.environ["BRAPI_TOKEN"] = "bench"
+    os.environ["COINGECKO_URL"] = f"{base}/coingecko/api/v3/coins/markets"
+    os.environ["FETCH_WORKERS"] = str(args.workers)
+    os.environ["FETCH_MAX_TOTAL"] = str(args.workers)
+    os.environ["HTTP_BACKOFF"] = "0"
+    for host in ("YAHOO", "BRAPI", "COINGECKO"):
+        os.environ[f"RATE_{host}"] = str(args.rate)
+
+    fake_yfinance.BASE_URL = base
+    sys.modules["yfinance"] = fake_yfinance
+    return config, server
+
+
+def tickers_for(nome, n, dead_rate):
+    _, modelo = TICKER_TABLES[nome]
+    mortos = int(n * dead_rate)
+    return [("ZZ" if i < mortos else "") + modelo.format(i) for i in range(n)]
+
+
+def setup_db(pasta, nome, n, dead_rate):
+    from sqlalchemy import text
+    from modules.db import build_engine
+    from modules.migrations import migrate
+
+    path = os.path.join(pasta, f"{nome}_{n}.sqlite")
+    engine = build_engine(f"sqlite:///{path}")
+    migrate(engine)
+    with engine.begin() as conn:
+        if nome != "cripto":
+            tabela, _ = TICKER_TABLES[nome]
+            conn.exec_driver_sql(f"CREATE TABLE {tabela} (ticker TEXT)")
+            conn.execute(
+                text(f"INSERT INTO {tabela} (ticker) VALUES (:t)"),
+                [{"t": t} for t in tickers_for(nome, n, dead_rate)],
+            )
+    return engine, path
+
+
+def build_processor(nome, engine, path, n):
+    from modules.cache import MetadataCache
+
+    if nome == "fiis":
+        from modules.fiis import FIIProcessor
+        return FIIProcessor(engine, cache=MetadataCache(":memory:")), None
+    if nome == "acoes":
+        from modules.acoes import AcoesProcessor
+        return AcoesProcessor(engine), None
+    if nome == "bdr":
+        from modules.bdr import BDRProcessor
+        return BDRProcessor(engine, cache=MetadataCache(":memory:")), None
+    if nome == "etf":
+        from modules.etf import ETFProcessor
+        return ETFProcessor(engine), None
+
+    from modules.cripto import CriptoFetcher, CriptoProcessor
+    conn = sqlite3.connect(path)
+    proc = CriptoProcessor(conn, maintain=False)
+    per_page = 250
+    proc.fetcher = CriptoFetcher(per_page=per_page, total_pages=math.ceil(n / per_page))
+    return proc, conn
+
+
+# -------------------------
+# Medição
+# -------------------------
+def quantil(valores, q):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def run_one(nome, n, args, config, pasta):
+    from modules import ratelimit
+    from modules.metrics import registry, set_processor
+
+    engine, path = setup_db(pasta, nome, n, args.dead_rate)
+    proc, conn = build_processor(nome, engine, path, n)
+    if nome == "cripto":
+        config.coins = n
+
+    registry.reset()
+    ratelimit._limiters.clear()  # cada medição começa do limite inicial do AIMD
+    set_processor(nome)
+    requisicoes = config.requests
+    throttled = config.throttled
+    log = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        proc.run()
+    wall = time.perf_counter() - start
+
+    # Latência por ticker: tarefa completa no FetchExecutor; processors em
+    # lote (ações sem fundamentos, cripto) caem na chamada de upstream
+    series = registry.series
+    por_ticker = [x for (p, u, o), s in series.items() if u == "ticker" for x in s.latencias]
+    if not por_ticker:
+        por_ticker = [
+            x for (p, u, o), s in series.items()
+            if u in ("yahoo", "brapi", "coingecko") and o != "rate_limit" for x in s.latencias
+        ]
+    escritas = [s for (p, u, o), s in series.items() if o.startswith("write:historico_")]
+    linhas = sum(s.rows for s in escritas)
+    tempo_db = sum(sum(s.latencias) for s in escritas)
+
+    limites = {
+        dict(labels)["upstream"]: valor
+        for (gauge, labels), valor in registry.gauges.items()
+        if gauge == "collector_concurrency_limit"
+    }
+
+    if conn is not None:
+        conn.close()
+    engine.dispose()
+    return {
+        "processor": nome,
+        "universo": n,
+        "segundos": round(wall, 3),
+        "tickers_s": round(n / wall, 1) if wall else 0.0,
+        "p50_ms": round(quantil(por_ticker, 0.50) * 1000, 1),
+        "p99_ms": round(quantil(por_ticker, 0.99) * 1000, 1),
+        "linhas_db": linhas,
+        "db_linhas_s": round(linhas / tempo_db, 1) if tempo_db else 0.0,
+        "requisicoes": config.requests - requisicoes,
+        "429s": config.throttled - throttled,
+        "limite_aimd": " ".join(f"{h}={v:g}" for h, v in sorted(limites.items())),
+    }
+
+
+def print_table(resultados):
+    colunas = ["processor", "universo", "segundos", "tickers_s", "p50_ms", "p99_ms",
+               "linhas_db", "db_linhas_s", "requisicoes", "429s", "limite_aimd"]
+    larguras = {c: max(len(c), *(len(str(r[c])) for r in resultados)) for c in colunas}
+    print("  ".join(c.rjust(larguras[c]) for c in colunas))
+    for r in resultados:
+        print("  ".join(str(r[c]).rjust(larguras[c]) for c in colunas))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config, server = install_stubs(args)
+    nomes = [p for p in args.processors.split(",") if p in PROCESSORS]
+    tamanhos = [int(s) for s in args.sizes.split(",") if s]
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        os.environ.setdefault("CACHE_PATH", os.path.join(pasta, "cache.sqlite"))
+        for nome in nomes:
+            for n in tamanhos:
+                print(f"⏳ {nome} com {n} símbolos...", flush=True)
+                resultados.append(run_one(nome, n, args, config, pasta))
+
+    server.shutdown()
+    print()
+    print_table(resultados)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# bench/stubs.py
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads")
+DEAD_PREFIX = "ZZ"  # símbolos "deslistados": sem dados em nenhuma fonte
+
+
+def load_payload(nome):
+    with open(os.path.join(PAYLOADS, nome)) as f:
+        return json.load(f)
+
+
+class StubConfig:
+    def __init__(self, latency=0.05, jitter=0.5, error_rate=0.0, coins=500, seed=42, capacity=0):
+        self.latency = latency          # segundos por requisição
+        self.jitter = jitter            # variação relativa (+/-)
+        self.error_rate = error_rate    # fração de respostas 503
+        self.coins = coins              # tamanho do universo CoinGecko
+        self.capacity = capacity        # requisições simultâneas antes do 429 (0 = sem limite)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.throttled = 0
+
+    def delay(self):
+        with self.lock:
+            self.requests += 1
+            fator = 1 + self.random.uniform(-self.jitter, self.jitter)
+            falhar = self.random.random() < self.error_rate
+        time.sleep(max(0.0, self.latency * fator))
+        return falhar
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            if self.capacity and self.in_flight > self.capacity:
+                self.throttled += 1
+                return False
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+# -------------------------
+# Payloads gravados, com preço determinístico por símbolo
+# -------------------------
+def preco(simbolo):
+    return round(5 + (zlib.crc32(simbolo.encode()) % 50000) / 100, 2)
+
+
+def brapi_result(simbolo):
+    item = dict(BRAPI)
+    p = preco(simbolo)
+    item.update(symbol=simbolo, regularMarketPrice=p, fiftyTwoWeekLow=round(p * 0.8, 2),
+                fiftyTwoWeekHigh=round(p * 1.2, 2))
+    return item
+
+
+def yahoo_info(simbolo):
+    item = dict(YAHOO)
+    p = preco(simbolo)
+    item.update(symbol=simbolo, currentPrice=p, regularMarketPrice=p)
+    return item
+
+
+def coingecko_page(per_page, page, total):
+    itens = []
+    for rank in range((page - 1) * per_page + 1, min(page * per_page, total) + 1):
+        item = dict(COINGECKO)
+        item.update(id=f"coin-{rank}", symbol=f"c{rank}", name=f"Coin {rank}",
+                    market_cap_rank=rank, current_price=preco(f"c{rank}"))
+        itens.append(item)
+    return itens
+
+
+def chart(simbolos, qs):
+    hoje = date.today()
+    if "start" in qs:
+        inicio = date.fromisoformat(qs["start"][0])
+        fim = date.fromisoformat(qs["end"][0])
+    else:
+        inicio, fim = hoje - timedelta(days=4), hoje + timedelta(days=1)
+
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days)]
+    dias = [d for d in dias if d.weekday() < 5]
+    if "start" not in qs:
+        dias = dias[-1:]
+
+    out = {}
+    for s in simbolos:
+        if s.startswith(DEAD_PREFIX):
+            continue
+        p = preco(s)
+        out[s] = [[d.isoformat(), p, p * 1.01, p * 0.99, p * 1.002, 100000] for d in dias]
+    return out
+
+
+BRAPI = load_payload("brapi_quote.json")
+YAHOO = load_payload("yahoo_info.json")
+COINGECKO = load_payload("coingecko_market.json")
+
+
+# -------------------------
+# Servidor
+# -------------------------
+class StubHandler(BaseHTTPRequestHandler):
+    config = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        try:
+            if not self.config.enter():
+                return self.send_json(429, {"error": "too many requests"}, {"Retry-After": "0"})
+            self.route()
+        finally:
+            self.config.leave()
+
+    def route(self):
+        if self.config.delay():
+            return self.send_json(503, {"error": "stub indisponível"}, {"Retry-After": "0"})
+
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+        partes = url.path.strip("/").split("/")
+
+        if partes[:3] == ["brapi", "api", "quote"]:
+            simbolos = partes[3].split(",")
+            results = [brapi_result(s) for s in simbolos if not s.startswith(DEAD_PREFIX)]
+            if not results:
+                return self.send_json(404, {"error": True, "message": "Não encontramos a ação"})
+            return self.send_json(200, {"results": results})
+
+        if partes[:2] == ["coingecko", "api"]:
+            per_page = int(qs.get("per_page", ["100"])[0])
+            page = int(qs.get("page", ["1"])[0])
+            return self.send_json(200, coingecko_page(per_page, page, self.config.coins))
+
+        if partes[:2] == ["yahoo", "info"]:
+            simbolo = partes[2]
+            if simbolo.startswith(DEAD_PREFIX):
+                return self.send_json(200, {"trailingPegRatio": None})
+            return self.send_json(200, yahoo_info(simbolo))
+
+        if partes[:2] == ["yahoo", "chart"]:
+            return self.send_json(200, chart(qs["symbols"][0].split(","), qs))
+
+        self.send_json(404, {"error": "rota desconhecida"})
+
+
+class StubServer(ThreadingHTTPServer):
+    # Backlog padrão (5) gera retransmissões de SYN de ~1s sob concorrência
+    request_queue_size = 128
+
+
+def start_stub(config, port=0):
+    handler = type("Handler", (StubHandler,), {"config": config})
+    server = StubServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -1,71 +1,89 @@
-from dotenv import load_dotenv
+import time
+
+_t0 = time.perf_counter()
+
 import os
-import psycopg2
-from sqlalchemy import create_engine
+import sys
+from modules import processors
+from modules.db import build_engine, check_connection, report_startup
+from modules.metrics import registry
+from modules.migrations import migrate
+from modules.orchestrator import Orchestrator
+
+_t_imports = time.perf_counter() - _t0
 
-# Carrega .env
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Cria a engine única usada por todos os módulos
+engine = build_engine()
 
 try:
-    # Teste com psycopg2
-    conn_test = psycopg2.connect(DATABASE_URL)
-    cur = conn_test.cursor()
-    cur.execute("SELECT NOW();")
-    print(f"✅ Conectado ao Neon! Hora do servidor: {cur.fetchone()[0]}")
-    cur.close()
-    conn_test.close()
+    agora, _t_connect = check_connection(engine)
+    print(f"✅ Conectado ao Neon! Hora do servidor: {agora}")
 except Exception as e:
+    _t_connect = 0.0
     print(f"❌ Erro ao conectar no Neon: {e}")
 
-# Cria engine para módulos que usam SQLAlchemy
-engine = create_engine(DATABASE_URL)
+# Schema versionado (uma consulta quando já está em dia)
+_t = time.perf_counter()
+migrate(engine)
+_t_migrate = time.perf_counter() - _t
 
-# Importa módulos
-from modules.fiis import FIIProcessor
-from modules.etf import ETFProcessor
-from modules.acoes import AcoesProcessor
-from modules.bdr import BDRProcessor
+# Uso: python main.py [fiis] [acoes] [bdr] [etf] [--backfill] [--exportar] [--arquivar]  (sem ativos roda todos)
+ATIVOS = ["fiis", "acoes", "bdr", "etf"]
+selecionados = [a for a in sys.argv[1:] if a in ATIVOS] or ATIVOS
+BACKFILL = "--backfill" in sys.argv
+EXPORTAR = "--exportar" in sys.argv or os.getenv("EXPORT_PARQUET") == "1"
+
+# Respostas brutas dos upstreams em data/raw (replay: python -m modules.archive)
+if "--arquivar" in sys.argv:
+    from modules import archive
+    archive.ENABLED = True
 
 print("\n==============================")
 print("  📊 COLETOR FINANCEIRO INICIADO")
 print("==============================\n")
 
-# ----------------------------
-# FIIs
-# ----------------------------
-try:
-    fii_proc = FIIProcessor(engine)
-    fii_proc.run()
-except Exception as e:
-    print(f"❌ ERRO durante o processamento de FIIs: {e}")
+# Imports pesados (yfinance/pandas) só acontecem dentro dos processors
+startup = {"imports": _t_imports, "conexão": _t_connect, "migrações": _t_migrate}
 
-# ----------------------------
-# Ações
-# ----------------------------
-try:
-    acoes_proc = AcoesProcessor(engine)
-    acoes_proc.run()
-except Exception as e:
-    print(f"❌ ERRO durante o processamento de Ações: {e}")
+def load_processor(nome):
+    # Import do módulo só quando a classe for rodar (modules/processors.py)
+    _t = time.perf_counter()
+    processor = processors.load_processor(nome)
+    startup[f"import {nome}"] = time.perf_counter() - _t
+    return processor
 
-# ----------------------------
-# BDRs
-# ----------------------------
-try:
-    bdr_proc = BDRProcessor(engine)
-    bdr_proc.run()
-except Exception as e:
-    print(f"❌ ERRO durante o processamento de BDR: {e}")
 
-# ----------------------------
-# ETFs
-# ----------------------------
-try:
-    etf_proc = ETFProcessor(engine)
-    etf_proc.run()
-except Exception as e:
-    print(f"❌ ERRO durante o processamento de ETF: {e}")
+def run_processor(nome):
+    proc = load_processor(nome)(engine)
+    if nome == "acoes" and BACKFILL:
+        # Só as lacunas de cada ticker desde o último dia gravado
+        proc.backfill()
+    else:
+        proc.run()
+
+
+# Classes de ativo em paralelo (tabelas distintas, gargalo é rede)
+orquestrador = Orchestrator()
+for nome in selecionados:
+    orquestrador.add(nome, lambda nome=nome: run_processor(nome))
+orquestrador.run()
+
+# Retornos, médias móveis e 52 semanas calculados do histórico gravado
+# (METRICAS_DERIVADAS=0 desliga; recalcular dias passados: python -m modules.derived --dias N)
+from modules import derived
+if derived.ENABLED:
+    derived.DerivedMetrics(engine).run(selecionados)
+
+# Linhas novas de cada classe para o dataset Parquet local
+if EXPORTAR:
+    from modules.export import ParquetExporter
+    ParquetExporter(engine).run(selecionados)
+
+report_startup(startup)
+for etapa, segundos in startup.items():
+    registry.set_gauge("collector_startup_seconds", round(segundos, 3), etapa=etapa)
+registry.write("diario")
+engine.dispose()
 
 print("\n==============================")
 print("  ✅ COLETA FINALIZADA")
@@ -1,12 +1,46 @@
 from dotenv import load_dotenv
 import os
+import sys
 import psycopg2
 from modules.cripto import CriptoProcessor
+from modules.db import build_engine
+from modules.metrics import registry, set_processor
+from modules.migrations import migrate
 
+# Uso: python maincripto.py [--daemon] [--particionar] [--exportar] [--arquivar]
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+set_processor("cripto")
+
+# Respostas brutas da CoinGecko em data/raw (replay: python -m modules.archive cripto)
+if "--arquivar" in sys.argv:
+    from modules import archive
+    archive.ENABLED = True
+
+# Schema versionado (uma consulta quando já está em dia)
+engine = build_engine(pool_size=1, max_overflow=0)
+migrate(engine)
+
+EXPORTAR = "--exportar" in sys.argv or os.getenv("EXPORT_PARQUET") == "1"
+
+if "--daemon" in sys.argv:
+    # Processo contínuo: snapshot a cada CRIPTO_INTERVALO_MIN, conexões aquecidas
+    from modules.cripto import CriptoDaemon
+    CriptoDaemon(engine, exportar=EXPORTAR).run()
+    engine.dispose()
+    sys.exit(0)
+
 conn = psycopg2.connect(DATABASE_URL)
 cripto_proc = CriptoProcessor(conn)
-cripto_proc.run()
+if "--particionar" in sys.argv:
+    # Conversão única de historico_cripto para particionamento mensal
+    cripto_proc.storage.migrate_to_partitioned()
+else:
+    cripto_proc.run()
+    if EXPORTAR:
+        from modules.export import ParquetExporter
+        ParquetExporter(engine).run(["cripto"])
+    registry.write("cripto")
 conn.close()
+engine.dispose()
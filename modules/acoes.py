@@ -1,131 +1,174 @@
 # modules/acoes.py
 import os
-import yfinance as yf
-from sqlalchemy import create_engine, text
-from datetime import datetime
-from dotenv import load_dotenv
-import time
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
+from sqlalchemy import text
+from collections import defaultdict
+from datetime import date, timedelta
+from modules import yahoo
+from modules.bulk import BulkWriter
+from modules.executor import FetchExecutor
+from modules.latest import LatestQuotes
+from modules.normalize import normalize
+from modules.pipeline import BatchCollector, Pipeline, load_tickers
+
 TICKERS_TABLE = "tickers_acoes"
-SLEEP_BETWEEN = 0.3
+BATCH_SIZE = yahoo.DOWNLOAD_BATCH  # tickers por chamada ao yf.download
+# Fundamentos exigem 1 chamada .info por ticker; desligue com ACOES_FUNDAMENTALS=0
+FETCH_FUNDAMENTALS = os.getenv("ACOES_FUNDAMENTALS", "1") != "0"
+# coluna -> (tipo, chaves do .info); ver modules/normalize.py
+FUNDAMENTALS_SCHEMA = {
+    "pl": ("float", ["yahoo.trailingPE"]),
+    "pvp": ("float", ["yahoo.priceToBook"]),
+    "beta": ("float", ["yahoo.beta"]),
+    "dividend_yield": ("float", ["yahoo.dividendYield"]),
+    "last_dividend": ("float", ["yahoo.lastDividendValue"]),
+    "dividend_date": ("epoch_date", ["yahoo.lastDividendDate"]),  # epoch em s (às vezes ms)
+}
+FUNDAMENTAL_COLUMNS = list(FUNDAMENTALS_SCHEMA)
+# coluna do yf.download -> coluna de historico_acoes
+PRICE_COLUMNS = {
+    "Open": "preco_abertura", "Close": "preco_fechamento", "High": "preco_maximo",
+    "Low": "preco_minimo", "Volume": "volume",
+}
+# Registro do arquivo bruto (modules/archive.py): .info + linha de preço do dia
+ARCHIVE_SCHEMA = {
+    "data": ("date", ["preco.data"]),
+    **{c: ("float", [f"preco.{c}"]) for c in PRICE_COLUMNS.values()},
+    **FUNDAMENTALS_SCHEMA,
+}
+# Janela inicial para tickers que ainda não têm histórico
+BACKFILL_DAYS = int(os.getenv("ACOES_BACKFILL_DAYS", "1825"))
+COLUMNS = [
+    "ticker", "data", "preco_abertura", "preco_fechamento", "preco_maximo", "preco_minimo",
+    "volume", *FUNDAMENTAL_COLUMNS,
+]
 
 class AcoesProcessor:
-    def __init__(self, engine):
+    def __init__(self, engine, fundamentals=None, executor=None):
         self.engine = engine
+        self.executor = executor or FetchExecutor()
+        self.fundamentals = FETCH_FUNDAMENTALS if fundamentals is None else fundamentals
+        self.precos = {}
+
+    def to_yf(self, ticker):
+        return yahoo.sa(ticker)
+
+    # -------------------------
+    # Preços em lote (yf.download multi-ticker)
+    # -------------------------
+    def download_history(self, tickers, indisponiveis=None, **periodo):
+        return yahoo.download(tickers, self.to_yf, indisponiveis, BATCH_SIZE, **periodo)
+
+    def price_frame(self, ticker, sub):
+        # Linhas do yf.download -> colunas de historico_acoes, sem iterar linha a linha
+        df = sub.reindex(columns=list(PRICE_COLUMNS)).rename(columns=PRICE_COLUMNS).astype("float64")
+        df.insert(0, "ticker", ticker.upper())
+        df.insert(1, "data", sub.index.date)
+        return df.reset_index(drop=True)
+
+    def fetch_prices(self, tickers, indisponiveis=None):
+        # Último pregão de cada ticker -> linha "preco" do payload (mesmo formato
+        # do arquivo bruto)
+        precos = {}
+        for ticker, sub in self.download_history(tickers, indisponiveis, period="1d"):
+            linha = self.price_frame(ticker, sub.iloc[[-1]]).iloc[0]
+            precos[ticker] = {
+                "data": linha["data"].isoformat(),
+                **{c: float(linha[c]) for c in PRICE_COLUMNS.values()},
+            }
+        return precos
+
+    def prefetch(self, tickers):
+        # Preços de todo o universo em poucas chamadas, antes dos fundamentos
+        print(f"Baixando preços de {len(tickers)} tickers em lotes de {BATCH_SIZE}...")
+        indisponiveis = set()
+        self.precos = self.fetch_prices(tickers, indisponiveis)
+        print(f"Preços recebidos para {len(self.precos)}/{len(tickers)} tickers.")
+        return indisponiveis
+
+    # -------------------------
+    # Fundamentos (1 chamada .info por ticker)
+    # -------------------------
+    def get_data(self, ticker):
+        # Payload bruto: linha de preço do prefetch + .info; sem preço não há o
+        # que gravar (sem dados, ou sem resposta quando o lote falhou)
+        preco = self.precos.get(ticker)
+        if preco is None:
+            return {}
+        payload = {"preco": preco}
+        if self.fundamentals:
+            payload["yahoo"] = yahoo.info(self.to_yf(ticker))
+        return payload
+
+    def frame(self, lote, dia=None):
+        # Data vem da linha de preço, não do dia da coleta
+        return normalize(ARCHIVE_SCHEMA, [p for _, p in lote], ticker=[t.upper() for t, _ in lote])
 
     def fetch_data(self, ticker):
-        ticker_yf = ticker if ticker.upper().endswith(".SA") else ticker + ".SA"
-        t = yf.Ticker(ticker_yf)
-
-        # Preço histórico do dia
-        hist = t.history(period="1d")
-        if hist.empty:
+        self.precos = self.fetch_prices([ticker])
+        payload = self.get_data(ticker)
+        if not payload:
             return None
-
-        row = hist.iloc[-1]
-
-        # Infos (podem falhar)
-        try:
-            info = t.info or {}
-        except:
-            info = {}
-
-        # lastDividendDate pode vir como timestamp gigante
-        div_date_raw = info.get("lastDividendDate")
-        if isinstance(div_date_raw, (int, float)):
-            try:
-                dividend_date = datetime.fromtimestamp(div_date_raw).date()
-            except:
-                dividend_date = None
-        else:
-            dividend_date = None
-
-
-        return { 
-                "ticker": ticker.upper(),
-                "data": row.name.date(),
-                "preco_abertura": float(row.get("Open")) if row.get("Open") is not None else None,
-                "preco_fechamento": float(row.get("Close")) if row.get("Close") is not None else None,
-                "preco_maximo": float(row.get("High")) if row.get("High") is not None else None,
-                "preco_minimo": float(row.get("Low")) if row.get("Low") is not None else None,
-                "volume": float(row.get("Volume")) if row.get("Volume") is not None else None,
-                "pl": float(info.get("trailingPE")) if info.get("trailingPE") is not None else None,
-                "pvp": float(info.get("priceToBook")) if info.get("priceToBook") is not None else None,
-                "beta": float(info.get("beta")) if info.get("beta") is not None else None,
-                "dividend_yield": float(info.get("dividendYield")) if info.get("dividendYield") is not None else None,
-                "last_dividend": float(info.get("lastDividendValue")) if info.get("lastDividendValue") is not None else None,
-                "dividend_date": dividend_date,
-        }
+        df = self.frame([(ticker, payload)])
+        return df.astype(object).where(df.notna(), None).iloc[0].to_dict()
+
+    def load_tickers(self):
+        # Schema de historico_acoes: modules/migrations.py
+        return load_tickers(self.engine, TICKERS_TABLE)
+
+    def writer(self, **kwargs):
+        # Upsert em lote (fundamentos nulos não apagam os já gravados)
+        return BulkWriter(
+            self.engine, "historico_acoes", COLUMNS,
+            conflict=("ticker", "data"), coalesce=FUNDAMENTAL_COLUMNS,
+            projections=[LatestQuotes("acoes")], **kwargs,
+        )
+
+    def collector(self):
+        return BatchCollector(
+            self.engine, "acoes", self.get_data, self.frame, self.writer, "preco_fechamento",
+            rotulo="Ações", executor=self.executor, prefetch=self.prefetch,
+        )
+
+    def replay(self, lotes):
+        self.collector().replay(lotes)
 
     def run(self):
-        # Criação da tabela — 1 única transação
-        with self.engine.begin() as conn:
-            conn.exec_driver_sql("""
-            CREATE TABLE IF NOT EXISTS historico_acoes (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT NOT NULL,
-                data DATE NOT NULL,
-                preco_abertura NUMERIC,
-                preco_fechamento NUMERIC,
-                preco_maximo NUMERIC,
-                preco_minimo NUMERIC,
-                volume NUMERIC,
-                pl NUMERIC,
-                pvp NUMERIC,
-                beta NUMERIC,
-                dividend_yield NUMERIC,
-                last_dividend NUMERIC,
-                dividend_date DATE,
-                UNIQUE(ticker, data)
-            )
-            """)
-
-            tickers = [r[0] for r in conn.execute(text(f"SELECT ticker FROM {TICKERS_TABLE}"))]
-
-        # INSERT preparado (fora da transação principal)
-        insert_sql = text("""
-            INSERT INTO historico_acoes (
-                ticker, data, preco_abertura, preco_fechamento, preco_maximo, preco_minimo,
-                volume, pl, pvp, beta, dividend_yield, last_dividend, dividend_date
-            )
-            VALUES (
-                :ticker, :data, :preco_abertura, :preco_fechamento, :preco_maximo, :preco_minimo,
-                :volume, :pl, :pvp, :beta, :dividend_yield, :last_dividend, :dividend_date
-            )
-            ON CONFLICT (ticker, data) DO UPDATE SET
-                preco_abertura = EXCLUDED.preco_abertura,
-                preco_fechamento = EXCLUDED.preco_fechamento,
-                preco_maximo = EXCLUDED.preco_maximo,
-                preco_minimo = EXCLUDED.preco_minimo,
-                volume = EXCLUDED.volume,
-                pl = EXCLUDED.pl,
-                pvp = EXCLUDED.pvp,
-                beta = EXCLUDED.beta,
-                dividend_yield = EXCLUDED.dividend_yield,
-                last_dividend = EXCLUDED.last_dividend,
-                dividend_date = EXCLUDED.dividend_date
-        """)
-
-        # Processamento ticker a ticker
-        for i, ticker in enumerate(tickers, start=1):
-            print(f"[{i}/{len(tickers)}] Processando {ticker}...")
-
-            try:
-                data = self.fetch_data(ticker)
-                if not data:
-                    print(f"⚠️ Nenhum dado para {ticker}")
-                    continue
-
-                with self.engine.begin() as conn:
-                    conn.execute(insert_sql, data)
-
-                print(f"✅ {ticker} atualizado com sucesso.")
-            except Exception as e:
-                print(f"❌ Erro {ticker}: {e}")
-
-            time.sleep(SLEEP_BETWEEN)
-
+        self.collector().run(self.load_tickers())
         print("=== Processamento de ações finalizado ===")
+
+    # -------------------------
+    # Backfill incremental
+    # -------------------------
+    def last_dates(self):
+        # Marca d'água por ticker em uma única consulta
+        with self.engine.begin() as conn:
+            rows = conn.execute(text("SELECT ticker, MAX(data) FROM historico_acoes GROUP BY ticker"))
+            return {r[0]: r[1] for r in rows}
+
+    def backfill(self, days=BACKFILL_DAYS):
+        tickers = self.load_tickers()
+        ultimas = self.last_dates()
+        hoje = date.today()
+        inicio_padrao = hoje - timedelta(days=days)
+
+        # Agrupa tickers pelo mesmo intervalo faltante -> 1 download por grupo/lote
+        grupos = defaultdict(list)
+        for ticker in tickers:
+            ultima = ultimas.get(ticker.upper())
+            inicio = ultima + timedelta(days=1) if ultima else inicio_padrao
+            if inicio <= hoje:
+                grupos[inicio].append(ticker)
+
+        pendentes = sum(len(g) for g in grupos.values())
+        print(f"Backfill: {pendentes}/{len(tickers)} tickers com lacunas em {len(grupos)} intervalo(s).")
+
+        # Download do próximo lote enquanto o anterior é gravado (COPY)
+        writer = self.writer(method="copy", batch_size=5000)
+        with Pipeline(writer) as pipe:
+            for inicio, grupo in sorted(grupos.items()):
+                print(f"⏳ {len(grupo)} tickers de {inicio} até {hoje}...")
+                fim = hoje + timedelta(days=1)  # end é exclusivo no yfinance
+                for ticker, sub in self.download_history(grupo, start=inicio.isoformat(), end=fim.isoformat()):
+                    pipe.write(self.price_frame(ticker, sub))
+
+        print("=== Backfill de ações finalizado ===")
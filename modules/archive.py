@@ -0,0 +1,144 @@
+# modules/archive.py
+# Arquivo bruto das respostas dos upstreams (Yahoo/brapi/CoinGecko), gravado
+# antes de qualquer normalização. Um bug de parsing que estragou um dia de dados
+# é corrigido reprocessando o arquivo, sem rede (o upstream não devolve o passado).
+#
+# Layout (append-only: cada execução grava um arquivo novo, nunca reescreve):
+#   <ARQUIVO_DIR>/classe=fiis/dia=2024-05-02/20240502T143000123456-4242.jsonl.gz
+# Uma linha JSON por ticker (cripto: por página do snapshot):
+#   {"ticker": "HGLG11", "payload": {"yahoo": {...}, "brapi": {...}, "cache": {...}}}
+#
+# Ligado com ARQUIVO_BRUTO=1 (ou main.py/maincripto.py --arquivar).
+# Replay:  python -m modules.archive [fiis] [acoes] [bdr] [etf] [cripto] [--de AAAA-MM-DD] [--ate AAAA-MM-DD]
+import gzip
+import json
+import os
+import zlib
+from datetime import date, datetime, timezone
+from modules.processors import PROCESSORS, load_processor
+
+# -------------------------
+# Configuração
+# -------------------------
+ENABLED = os.getenv("ARQUIVO_BRUTO", "0") == "1"
+ARCHIVE_DIR = os.getenv("ARQUIVO_DIR", os.path.join("data", "raw"))
+COMPRESSION_LEVEL = int(os.getenv("ARQUIVO_COMPRESSAO", "6"))  # gzip 1-9
+REPLAY_BATCH = 500  # registros por lote normalizado no replay
+
+
+# -------------------------
+# Gravação
+# -------------------------
+class RawArchive:
+    def __init__(self, classe, dia=None, pasta=ARCHIVE_DIR, enabled=None):
+        self.classe = classe
+        self.dia = dia or date.today()
+        self.pasta = pasta
+        self.enabled = ENABLED if enabled is None else enabled
+        self.file = None
+        self.path = None
+        self.records = 0
+
+    def _open(self):
+        destino = os.path.join(self.pasta, f"classe={self.classe}", f"dia={self.dia.isoformat()}")
+        os.makedirs(destino, exist_ok=True)
+        nome = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{os.getpid()}.jsonl.gz"
+        self.path = os.path.join(destino, nome)
+        self.file = gzip.open(self.path, "wt", encoding="utf-8", compresslevel=COMPRESSION_LEVEL)
+
+    def add(self, payload, **campos):
+        if not self.enabled:
+            return
+        if self.file is None:
+            self._open()
+        self.file.write(json.dumps({**campos, "payload": payload}, default=str, ensure_ascii=False))
+        self.file.write("\n")
+        self.records += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        print(f"🗃️ Arquivo bruto {self.classe}: {self.records} registros em {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# -------------------------
+# Leitura
+# -------------------------
+def iter_days(classe, de=None, ate=None, pasta=ARCHIVE_DIR):
+    base = os.path.join(pasta, f"classe={classe}")
+    if not os.path.isdir(base):
+        return
+    for nome in sorted(os.listdir(base)):
+        if not nome.startswith("dia="):
+            continue
+        dia = date.fromisoformat(nome[4:])
+        if (de and dia < de) or (ate and dia > ate):
+            continue
+        arquivos = sorted(f for f in os.listdir(os.path.join(base, nome)) if f.endswith(".jsonl.gz"))
+        yield dia, [os.path.join(base, nome, f) for f in arquivos]
+
+
+def read(path):
+    # Arquivo de uma execução que morreu no meio termina truncado: vale o que foi gravado
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for linha in f:
+                if linha.endswith("\n"):
+                    yield json.loads(linha)
+    except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+        print(f"⚠️ {path} truncado ({e}); registros completos aproveitados.")
+
+
+def batches(classe, de=None, ate=None, tamanho=REPLAY_BATCH, pasta=ARCHIVE_DIR):
+    # (dia, [registros]) em lotes que não cruzam dias; execuções na ordem em que
+    # rodaram (a mais recente vence no upsert)
+    for dia, arquivos in iter_days(classe, de, ate, pasta):
+        lote = []
+        for path in arquivos:
+            for registro in read(path):
+                lote.append(registro)
+                if len(lote) >= tamanho:
+                    yield dia, lote
+                    lote = []
+        if lote:
+            yield dia, lote
+
+
+# -------------------------
+# Replay
+# -------------------------
+def replay(engine, classes=None, de=None, ate=None, pasta=ARCHIVE_DIR):
+    from modules.export import mark_stale
+
+    for classe in classes or list(PROCESSORS):
+        processor = load_processor(classe)(engine)
+        print(f"⏪ Replay {classe} ({de or 'início'} a {ate or 'hoje'})...")
+        dias = set()
+        processor.replay((dias.add(dia) or dia, lote) for dia, lote in batches(classe, de, ate, pasta=pasta))
+        # Dias já exportados para Parquet são reescritos na próxima exportação
+        mark_stale(engine, classe, dias)
+
+
+if __name__ == "__main__":
+    import sys
+    from modules.db import build_engine
+    from modules.metrics import set_processor
+
+    def opcao(nome):
+        if nome in sys.argv:
+            return date.fromisoformat(sys.argv[sys.argv.index(nome) + 1])
+        return None
+
+    engine = build_engine()
+    set_processor("replay")
+    replay(engine, [c for c in sys.argv[1:] if c in PROCESSORS] or None, opcao("--de"), opcao("--ate"))
+    engine.dispose()
@@ -1,170 +1,101 @@
 # modules/bdr.py
-import requests
-import yfinance as yf
-from sqlalchemy import create_engine, text
-from datetime import datetime
-from dotenv import load_dotenv
-import os
-import time
+from modules import yahoo
+from modules.brapi import BrapiClient
+from modules.bulk import BulkWriter
+from modules.cache import get_cache
+from modules.executor import FetchExecutor
+from modules.latest import LatestQuotes
+from modules.normalize import normalize
+from modules.pipeline import BatchCollector, load_tickers
+from modules.sources import SourceFallback
 
 # -------------------------
 # Configuração
 # -------------------------
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-BRAPI_TOKEN = os.getenv("BRAPI_TOKEN")
 TICKERS_TABLE = "tickers_bdr"
-SLEEP_BETWEEN = 0.3  # pausa entre chamadas
-
-# -------------------------
-# Conexão com DB
-# -------------------------
-engine = create_engine(DATABASE_URL)
+# coluna -> (tipo, chaves de origem em ordem de preferência); ver modules/normalize.py
+# Yahoo primeiro; brapi cobre a cotação quando o .info falha ou é pulado;
+# "cache" quando o .info omite o perfil
+SCHEMA = {
+    "preco_atual": ("float", ["yahoo.regularMarketPrice", "brapi.regularMarketPrice"]),
+    "preco_52_semana_alta": ("float", ["yahoo.fiftyTwoWeekHigh", "brapi.fiftyTwoWeekHigh"]),
+    "preco_52_semana_baixa": ("float", ["yahoo.fiftyTwoWeekLow", "brapi.fiftyTwoWeekLow"]),
+    "preco_media_50d": ("float", ["yahoo.fiftyDayAverage"]),
+    "preco_media_200d": ("float", ["yahoo.twoHundredDayAverage"]),
+    "p_l": ("float", ["yahoo.trailingPE", "brapi.priceEarnings"]),
+    "p_vp": ("float", ["yahoo.priceToBook"]),
+    "p_s": ("float", ["yahoo.priceToSalesTrailing12Months"]),
+    "market_cap": ("float", ["yahoo.marketCap", "brapi.marketCap"]),
+    "enterprise_value": ("float", ["yahoo.enterpriseValue"]),
+    "roe": ("float", ["yahoo.returnOnEquity"]),
+    "roa": ("float", ["yahoo.returnOnAssets"]),
+    "margem_lucro": ("float", ["yahoo.profitMargins"]),
+    "margem_operacional": ("float", ["yahoo.operatingMargins"]),
+    "dividend_yield": ("float", ["yahoo.dividendYield"]),
+    "payout_ratio": ("float", ["yahoo.payoutRatio"]),
+    "crescimento_receita": ("float", ["yahoo.revenueGrowth"]),
+    "crescimento_lucro": ("float", ["yahoo.earningsGrowth"]),
+    "beta": ("float", ["yahoo.beta"]),
+    "setor": ("text", ["yahoo.sector", "cache.setor"]),
+    "industria": ("text", ["yahoo.industry", "cache.industria"]),
+    "nome_empresa": ("text", ["yahoo.longName", "cache.nome_empresa"]),
+}
+FIELDS = ["ticker", "data_registro", *SCHEMA]
+# Sem estes campos o ticker passa pelo fallback da brapi (modules/sources.py)
+REQUIRED = ["preco_atual", "preco_52_semana_alta", "preco_52_semana_baixa", "market_cap"]
+# Só o que não muda de um dia para o outro vai para o cache (TTL por grupo em
+# modules/cache.py). Com o perfil em dia o .info não é chamado: cotação, 52
+# semanas, P/L e market cap do dia vêm da brapi em lote, médias e 52 semanas
+# também de modules/derived.py; os demais índices ficam NULL nesses dias
+CACHED_GROUPS = {
+    "perfil": ["setor", "industria", "nome_empresa"],
+}
 
 # -------------------------
 # Processor
 # -------------------------
 class BDRProcessor:
-    def __init__(self, engine):
+    def __init__(self, engine, executor=None, brapi=None, cache=None):
         self.engine = engine
-
-    def fetch_brapi(self, ticker):
-        try:
-            url = f"https://brapi.dev/api/quote/{ticker}"
-            r = requests.get(url, params={"token": BRAPI_TOKEN}, timeout=10).json()
-            results = r.get("results")
-            if not results:
-                return {}
-            data = results[0]
-            return {
-                "preco_atual": data.get("regularMarketPrice"),
-                "preco_52_semana_alta": data.get("fiftyTwoWeekHigh"),
-                "preco_52_semana_baixa": data.get("fiftyTwoWeekLow"),
-                "market_cap": data.get("marketCap"),
-                "p_l": data.get("priceEarnings"),
-            }
-        except Exception:
-            return {}
-
-    def fetch_yahoo(self, ticker):
-        try:
-            t = yf.Ticker(ticker + ".SA")
-            info = t.info
-            return {
-                "preco_atual": info.get("regularMarketPrice"),
-                "preco_52_semana_alta": info.get("fiftyTwoWeekHigh"),
-                "preco_52_semana_baixa": info.get("fiftyTwoWeekLow"),
-                "preco_media_50d": info.get("fiftyDayAverage"),
-                "preco_media_200d": info.get("twoHundredDayAverage"),
-                "p_l": info.get("trailingPE"),
-                "p_vp": info.get("priceToBook"),
-                "p_s": info.get("priceToSalesTrailing12Months"),
-                "market_cap": info.get("marketCap"),
-                "enterprise_value": info.get("enterpriseValue"),
-                "roe": info.get("returnOnEquity"),
-                "roa": info.get("returnOnAssets"),
-                "margem_lucro": info.get("profitMargins"),
-                "margem_operacional": info.get("operatingMargins"),
-                "dividend_yield": info.get("dividendYield"),
-                "payout_ratio": info.get("payoutRatio"),
-                "crescimento_receita": info.get("revenueGrowth"),
-                "crescimento_lucro": info.get("earningsGrowth"),
-                "beta": info.get("beta"),
-                "setor": info.get("sector"),
-                "industria": info.get("industry"),
-                "nome_empresa": info.get("longName"),
-            }
-        except Exception:
-            return {}
-
-    def merge_data(self, brapi, yahoo):
-        return {**(brapi or {}), **(yahoo or {})}
-
-    def run(self):
-        fields = [
-            "ticker", "data_registro", "preco_atual", "preco_52_semana_alta", "preco_52_semana_baixa",
-            "preco_media_50d", "preco_media_200d", "p_l", "p_vp", "p_s", "market_cap",
-            "enterprise_value", "roe", "roa", "margem_lucro", "margem_operacional",
-            "dividend_yield", "payout_ratio", "crescimento_receita", "crescimento_lucro",
-            "beta", "setor", "industria", "nome_empresa"
-        ]
-
-        # Criar tabela se não existir
-        with self.engine.begin() as conn:
-            conn.exec_driver_sql("""
-            CREATE TABLE IF NOT EXISTS historico_bdr (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT NOT NULL,
-                data_registro DATE,
-                preco_atual NUMERIC,
-                preco_52_semana_alta NUMERIC,
-                preco_52_semana_baixa NUMERIC,
-                preco_media_50d NUMERIC,
-                preco_media_200d NUMERIC,
-                p_l NUMERIC,
-                p_vp NUMERIC,
-                p_s NUMERIC,
-                market_cap NUMERIC,
-                enterprise_value NUMERIC,
-                roe NUMERIC,
-                roa NUMERIC,
-                margem_lucro NUMERIC,
-                margem_operacional NUMERIC,
-                dividend_yield NUMERIC,
-                payout_ratio NUMERIC,
-                crescimento_receita NUMERIC,
-                crescimento_lucro NUMERIC,
-                beta NUMERIC,
-                setor TEXT,
-                industria TEXT,
-                nome_empresa TEXT
-            )
-            """)
-
-        # Ler tickers
-        with self.engine.begin() as conn:
-            tickers = [r[0] for r in conn.execute(text(f"SELECT ticker FROM {TICKERS_TABLE}")).fetchall()]
-
-        insert_sql = text("""
-        INSERT INTO historico_bdr (
-            ticker, data_registro, preco_atual, preco_52_semana_alta, preco_52_semana_baixa,
-            preco_media_50d, preco_media_200d, p_l, p_vp, p_s, market_cap,
-            enterprise_value, roe, roa, margem_lucro, margem_operacional,
-            dividend_yield, payout_ratio, crescimento_receita, crescimento_lucro,
-            beta, setor, industria, nome_empresa
-        ) VALUES (
-            :ticker, :data_registro, :preco_atual, :preco_52_semana_alta, :preco_52_semana_baixa,
-            :preco_media_50d, :preco_media_200d, :p_l, :p_vp, :p_s, :market_cap,
-            :enterprise_value, :roe, :roa, :margem_lucro, :margem_operacional,
-            :dividend_yield, :payout_ratio, :crescimento_receita, :crescimento_lucro,
-            :beta, :setor, :industria, :nome_empresa
+        self.executor = executor or FetchExecutor()
+        self.brapi = brapi or BrapiClient()
+        self.cache = cache or get_cache()
+
+    def get_data(self, ticker):
+        # Payload bruto por fonte; a conversão de tipos é feita em lote em frame
+        # Perfil em dia no cache: sem .info; a cotação do dia vem em lote da
+        # brapi (fallback dos campos de REQUIRED)
+        cache = self.cache.fresh("yahoo", ticker, CACHED_GROUPS)
+        if cache is not None:
+            return {"cache": cache}
+        info = yahoo.info(yahoo.sa(ticker))
+        return {"yahoo": info, "cache": self.cache.refresh(SCHEMA, "yahoo", ticker, info, CACHED_GROUPS)}
+
+    def fallback(self):
+        return SourceFallback("BDR", SCHEMA, REQUIRED, {"brapi": self.brapi.quote_many})
+
+    def writer(self, **kwargs):
+        # Upsert por (ticker, data_registro); schema em modules/migrations.py
+        return BulkWriter(
+            self.engine, "historico_bdr", FIELDS,
+            conflict=("ticker", "data_registro"), projections=[LatestQuotes("bdr")], **kwargs,
         )
-        """)
-
-        # Loop de processamento
-        for i, ticker in enumerate(tickers, start=1):
-            if not ticker:
-                print(f"⚠️ Ticker vazio na posição {i}, pulando...")
-                continue
-
-            print(f"[{i}/{len(tickers)}] Processando {ticker}...")
 
-            try:
-                brapi = self.fetch_brapi(ticker)
-                yahoo = self.fetch_yahoo(ticker)
-                merged = self.merge_data(brapi, yahoo)
+    def frame(self, lote, dia):
+        return normalize(SCHEMA, [p for _, p in lote], ticker=[t for t, _ in lote], data_registro=dia)
 
-                safe_data = {field: merged.get(field) for field in fields}
-                safe_data["ticker"] = ticker
-                safe_data["data_registro"] = datetime.now().date()
-
-                with self.engine.begin() as conn:
-                    conn.execute(insert_sql, safe_data)
-
-                print(f"✅ {ticker} registrado.")
-            except Exception as e:
-                print(f"❌ Erro {ticker}: {e}")
+    def collector(self, fallback=None):
+        # Nem brapi nem Yahoo têm cotação: provável BDR deslistado
+        return BatchCollector(
+            self.engine, "bdr", self.get_data, self.frame, self.writer, "preco_atual",
+            rotulo="BDRs", executor=self.executor, fallback=fallback,
+        )
 
-            time.sleep(SLEEP_BETWEEN)
+    def replay(self, lotes):
+        self.collector().replay(lotes)
 
+    def run(self):
+        self.collector(self.fallback()).run(load_tickers(self.engine, TICKERS_TABLE))
+        print(f"BRAPI: {self.brapi.requests_made} requisições.")
+        self.cache.report("BDR")
         print("=== Processamento de BDR finalizado ===")
@@ -0,0 +1,88 @@
+# modules/brapi.py
+import os
+import requests
+from dotenv import load_dotenv
+from modules.http_client import get_session
+from modules.ratelimit import limited, retry_throttled
+
+# -------------------------
+# Configuração
+# -------------------------
+load_dotenv()
+BRAPI_TOKEN = os.getenv("BRAPI_TOKEN")
+BRAPI_URL = os.getenv("BRAPI_URL", "https://brapi.dev/api/quote/")
+BATCH_SIZE = int(os.getenv("BRAPI_BATCH_SIZE", "20"))  # tickers por requisição
+TIMEOUT = 10
+INVALID_STATUS = (400, 404)  # lote recusado por símbolo inválido: vale dividir
+
+
+# -------------------------
+# Cliente
+# -------------------------
+# Agrupa tickers em chamadas multi-símbolo (/quote/PETR4,VALE3,...) sobre uma
+# sessão com keep-alive e retry, e devolve um dict ticker -> resultado.
+# Símbolos ausentes simplesmente não aparecem no retorno; se o lote inteiro
+# for rejeitado por símbolo inválido (400/404) ele é dividido ao meio até isolar
+# o(s) ticker(s). 429/5xx/timeout que sobraram depois dos retries do urllib3
+# encerram a consulta: dividir só multiplicaria requisições contra um host
+# sobrecarregado.
+class BrapiClient:
+    def __init__(self, token=BRAPI_TOKEN, batch_size=BATCH_SIZE, session=None):
+        self.token = token
+        self.batch_size = max(1, batch_size)
+        self.session = session or get_session("brapi")
+        self.params = {"token": token} if token else {}
+        self.requests_made = 0
+
+    def _request(self, url):
+        self.requests_made += 1
+        with limited("brapi", "quote") as obs:
+            r = self.session.get(url, params=self.params, timeout=TIMEOUT)
+            obs.bytes = len(r.content)
+            r.raise_for_status()
+            return r.json().get("results") or []
+
+    def _get(self, tickers):
+        url = BRAPI_URL + ",".join(tickers)
+        return retry_throttled(lambda: self._request(url))
+
+    def _fetch_batch(self, tickers):
+        try:
+            results = self._get(tickers)
+        except requests.HTTPError as e:
+            if getattr(e.response, "status_code", None) not in INVALID_STATUS:
+                raise
+            if len(tickers) == 1:
+                print(f"Erro BRAPI {tickers[0]}: {e}")
+                return {}
+            meio = len(tickers) // 2
+            return {**self._fetch_batch(tickers[:meio]), **self._fetch_batch(tickers[meio:])}
+
+        return {
+            item["symbol"].upper(): item
+            for item in results
+            if isinstance(item, dict) and item.get("symbol")
+        }
+
+    def quote_many(self, tickers):
+        # -> ({TICKER: resultado}, {TICKER sem resposta}). Host indisponível
+        # encerra a consulta; o que os lotes anteriores trouxeram fica, e só os
+        # tickers não consultados voltam como sem resposta (modules/sources.py)
+        tickers = list(dict.fromkeys(t.upper() for t in tickers if t))
+        quotes = {}
+        sem_resposta = set()
+        for start in range(0, len(tickers), self.batch_size):
+            try:
+                quotes.update(self._fetch_batch(tickers[start:start + self.batch_size]))
+            except Exception as e:
+                sem_resposta.update(tickers[start:])
+                print(f"❌ BRAPI indisponível ({e}); {len(sem_resposta)} ticker(s) ficam sem consulta nesta execução.")
+                break
+
+        faltando = [t for t in tickers if t not in quotes and t not in sem_resposta]
+        if faltando:
+            print(f"⚠️ BRAPI sem dados para {len(faltando)} ticker(s): {', '.join(faltando[:10])}")
+        return quotes, sem_resposta
+
+    def quote(self, ticker):
+        return self.quote_many([ticker])[0].get(ticker.upper(), {})
@@ -0,0 +1,242 @@
+# modules/bulk.py
+import io
+import time
+from psycopg2.extras import execute_values
+from modules.metrics import measure
+
+# -------------------------
+# Configuração
+# -------------------------
+BATCH_SIZE = 500  # linhas por flush
+COPY_THRESHOLD = 5000  # acima disso "auto" usa COPY + staging
+
+
+def _is_sqlite(conn):
+    # SQLite (benchmarks/testes locais): sem execute_values nem COPY
+    raw = getattr(conn, "dbapi_connection", conn)
+    return type(raw).__module__.startswith("sqlite3")
+
+
+def _copy_value(value):
+    # Formato texto do COPY: NULL = \N, escapar barra, tab e quebras de linha
+    if value is None or (isinstance(value, float) and value != value):
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+# -------------------------
+# Writer
+# -------------------------
+# Acumula linhas e grava em lotes (INSERT multi-row ou COPY + merge).
+# `db` pode ser uma engine SQLAlchemy ou uma conexão psycopg2.
+# Com `conflict` o INSERT vira upsert (ON CONFLICT ... DO UPDATE); colunas em
+# `coalesce` só são sobrescritas quando o valor novo não é NULL.
+# `conflict_where` restringe o DO UPDATE (ex.: só se o valor novo for mais recente).
+# `projections` gravam tabelas derivadas na mesma transação de cada lote
+# (ex.: latest_quotes); `after_flush(columns, rows)` é chamado depois de cada
+# lote com as linhas que de fato foram gravadas (nada gravado, nada chamado).
+class BulkWriter:
+    def __init__(self, db, table, columns, conflict=None, update=None, coalesce=(),
+                 method="auto", batch_size=BATCH_SIZE, after_flush=None,
+                 conflict_where=None, projections=()):
+        self.db = db
+        self.table = table
+        self.columns = list(columns)
+        self.conflict = list(conflict or [])
+        if update is None:
+            update = [c for c in self.columns if c not in self.conflict]
+        self.update = list(update)
+        self.coalesce = set(coalesce)
+        self.method = method
+        self.batch_size = batch_size
+        self.after_flush = after_flush
+        self.conflict_where = conflict_where
+        self.projections = list(projections)
+
+        self.buffer = []
+        self.rows = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    # -------------------------
+    # SQL
+    # -------------------------
+    def _on_conflict(self):
+        if not self.conflict:
+            return ""
+        keys = ", ".join(self.conflict)
+        if not self.update:
+            return f" ON CONFLICT ({keys}) DO NOTHING"
+        sets = []
+        for c in self.update:
+            if c in self.coalesce:
+                sets.append(f"{c} = COALESCE(EXCLUDED.{c}, {self.table}.{c})")
+            else:
+                sets.append(f"{c} = EXCLUDED.{c}")
+        where = f" WHERE {self.conflict_where}" if self.conflict_where else ""
+        return f" ON CONFLICT ({keys}) DO UPDATE SET " + ", ".join(sets) + where
+
+    def _values_sql(self):
+        cols = ", ".join(self.columns)
+        return f"INSERT INTO {self.table} ({cols}) VALUES %s" + self._on_conflict()
+
+    # -------------------------
+    # Buffer
+    # -------------------------
+    def add(self, row):
+        self.buffer.append(tuple(row.get(c) for c in self.columns))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def add_frame(self, df):
+        # DataFrame já tipado (modules/normalize.py): conversão por coluna, não
+        # por linha; NaN/NaT/NA viram NULL e timestamps viram datetime do Python
+        import pandas as pd
+
+        if df.empty:
+            return
+        df = df.reindex(columns=self.columns)
+        for c in df.columns:
+            if df[c].dtype.kind == "M":
+                df[c] = pd.Series(df[c].dt.to_pydatetime(), index=df.index, dtype=object)
+        valores = df.astype(object).where(df.notna(), None)
+        self.buffer.extend(valores.itertuples(index=False, name=None))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def _dedupe(self, rows):
+        # Postgres não aceita o mesmo conflito duas vezes no mesmo comando
+        if not self.conflict:
+            return rows
+        idx = [self.columns.index(c) for c in self.conflict]
+        unique = {}
+        for r in rows:
+            unique[tuple(r[i] for i in idx)] = r
+        return list(unique.values())
+
+    # -------------------------
+    # Gravação
+    # -------------------------
+    def _connect(self):
+        if hasattr(self.db, "raw_connection"):
+            return self.db.raw_connection(), True
+        return self.db, False
+
+    def _write_values(self, cur, rows):
+        execute_values(cur, self._values_sql(), rows, page_size=self.batch_size)
+
+    def _write_qmark(self, cur, rows):
+        # INSERT multi-row com placeholders "?" (limite de 999 variáveis por comando)
+        cols = ", ".join(self.columns)
+        linha = "(" + ", ".join("?" for _ in self.columns) + ")"
+        por_comando = max(1, 999 // len(self.columns))
+        for start in range(0, len(rows), por_comando):
+            lote = rows[start:start + por_comando]
+            sql = f"INSERT INTO {self.table} ({cols}) VALUES " + ", ".join([linha] * len(lote))
+            cur.execute(sql + self._on_conflict(), [v for r in lote for v in r])
+
+    def _write_copy(self, cur, rows):
+        cols = ", ".join(self.columns)
+        stage = f"_stage_{self.table}"
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DROP AS "
+            f"SELECT {cols} FROM {self.table} WITH NO DATA"
+        )
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join(_copy_value(v) for v in r))
+            buf.write("\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY {stage} ({cols}) FROM STDIN", buf)
+        cur.execute(
+            f"INSERT INTO {self.table} ({cols}) SELECT {cols} FROM {stage}" + self._on_conflict()
+        )
+
+    def write_rows(self, cur, rows, sqlite=False, use_copy=False):
+        if sqlite:
+            self._write_qmark(cur, rows)
+        elif use_copy:
+            self._write_copy(cur, rows)
+        else:
+            self._write_values(cur, rows)
+
+    def _write(self, conn, rows, use_copy):
+        cur = conn.cursor()
+        try:
+            with measure("postgres", f"write:{self.table}") as obs:
+                sqlite = _is_sqlite(conn)
+                self.write_rows(cur, rows, sqlite, use_copy)
+                for projection in self.projections:
+                    projection.write(cur, self.columns, rows, sqlite)
+                conn.commit()
+                obs.rows = len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        rows = self._dedupe(self.buffer)
+        self.buffer = []
+
+        use_copy = self.method == "copy" or (self.method == "auto" and len(rows) >= COPY_THRESHOLD)
+        start = time.perf_counter()
+        conn, owned = self._connect()
+        gravadas = []
+        try:
+            try:
+                self._write(conn, rows, use_copy)
+                gravadas = rows
+            except Exception as e:
+                print(f"❌ Erro ao gravar lote de {len(rows)} linhas em {self.table}: {e}")
+                if len(rows) == 1:
+                    self.failed += 1
+                else:
+                    # Isola a(s) linha(s) problemática(s) sem perder o lote inteiro
+                    for r in rows:
+                        try:
+                            self._write(conn, [r], False)
+                            gravadas.append(r)
+                        except Exception as e_row:
+                            self.failed += 1
+                            print(f"❌ Linha rejeitada em {self.table} {r[:2]}: {e_row}")
+        finally:
+            if owned:
+                conn.close()
+            self.elapsed += time.perf_counter() - start
+            self.rows += len(gravadas)
+
+        if self.after_flush and gravadas:
+            self.after_flush(self.columns, gravadas)
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def close(self):
+        self.flush()
+        print(
+            f"💾 {self.table}: {self.rows} linhas gravadas em {self.elapsed:.2f}s "
+            f"({self.rows_per_sec:.0f} linhas/s)"
+            + (f", {self.failed} rejeitadas" if self.failed else "")
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
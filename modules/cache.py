@@ -0,0 +1,155 @@
+# modules/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# -------------------------
+# Configuração
+# -------------------------
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(".cache", "metadata.sqlite"))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+DAY = 86400
+# Com todos os grupos do ticker válidos o processor pula o .info e busca só a
+# cotação do dia em lote; índices que só o .info traz ficam NULL nesses dias
+SKIP_INFO = os.getenv("CACHE_PULAR_INFO", "1") != "0"
+
+# TTL (segundos) por grupo de campos; 0 desliga o cache do grupo
+TTLS = {
+    "perfil": float(os.getenv("CACHE_TTL_PERFIL", str(30 * DAY))),          # setor, nome, indústria
+    "fundamentos": float(os.getenv("CACHE_TTL_FUNDAMENTOS", str(7 * DAY))),  # balanço, margens, beta
+}
+
+
+# -------------------------
+# Cache em SQLite
+# -------------------------
+# Chave (source, ticker, grupo) -> dict JSON. Entradas vencidas contam como
+# miss; acima de MAX_ENTRIES as menos acessadas são descartadas.
+class MetadataCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttls=None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.ttls = {**TTLS, **(ttls or {})}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                source TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                grupo TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (source, ticker, grupo)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0  # chamadas .info evitadas
+        self._writes = 0
+
+    def get(self, source, ticker, grupo):
+        ttl = self.ttls.get(grupo, 0)
+        if ttl <= 0:
+            self.misses += 1
+            return None
+
+        key = (source, ticker.upper(), grupo)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT valor, updated_at FROM cache WHERE source = ? AND ticker = ? AND grupo = ?", key
+            ).fetchone()
+            if row is None or now - row[1] > ttl:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE source = ? AND ticker = ? AND grupo = ?", (now, *key)
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, source, ticker, grupo, valor):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (source, ticker, grupo, valor, updated_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (source, ticker.upper(), grupo, json.dumps(valor, default=str), now, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+
+    def fresh(self, source, ticker, grupos, enabled=SKIP_INFO):
+        # Valores de todos os grupos, ou None se algum venceu (hora de buscar o .info)
+        if not enabled:
+            return None
+        valores = {}
+        for grupo in grupos:
+            cached = self.get(source, ticker, grupo)
+            if cached is None:
+                return None
+            valores.update(cached)
+        self.skipped += 1
+        return valores
+
+    def refresh(self, schema, source, ticker, payload, grupos):
+        # Grupo completo no payload renova o cache; incompleto usa o cache como
+        # reserva (colunas "cache.*" do schema, modules/normalize.py)
+        from modules.normalize import extract
+
+        reserva = {}
+        for grupo, campos in grupos.items():
+            valores = extract(schema, source, payload, campos)
+            if all(v is not None for v in valores.values()):
+                self.set(source, ticker, grupo, valores)
+            else:
+                reserva.update(self.get(source, ticker, grupo) or {})
+        return reserva
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        excesso = total - self.max_entries
+        if excesso > 0:
+            self.conn.execute(
+                "DELETE FROM cache WHERE rowid IN "
+                "(SELECT rowid FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (excesso,),
+            )
+
+    def close(self):
+        with self.lock:
+            self._evict()
+            self.conn.close()
+
+    def report(self, nome):
+        total = self.hits + self.misses
+        if total:
+            print(
+                f"🗄️ Cache {nome}: {self.hits}/{total} hits ({self.hits / total:.0%}), "
+                f"{self.skipped} chamadas .info evitadas."
+            )
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+
+# -------------------------
+# Instância compartilhada
+# -------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
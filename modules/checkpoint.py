@@ -0,0 +1,108 @@
+# modules/checkpoint.py
+import os
+import threading
+from datetime import date, timedelta
+from sqlalchemy import text
+from modules.bulk import BulkWriter
+
+# -------------------------
+# Configuração
+# -------------------------
+TABLE = "coleta_checkpoint"
+ENABLED = os.getenv("COLETA_CHECKPOINT", "1") != "0"            # 0 = sempre coleta tudo
+RETENTION_DAYS = int(os.getenv("CHECKPOINT_RETENCAO_DIAS", "7"))
+COLUMNS = ["processor", "data_execucao", "ticker", "status"]
+DONE = "ok"  # demais status ("erro", "sem_dados") são tentados de novo na próxima execução
+
+
+# -------------------------
+# Checkpoint por (processor, dia, ticker)
+# -------------------------
+# Uma execução repetida no mesmo dia (job que morreu no meio, timeout, tempestade
+# de 429) só busca os tickers que ainda não foram gravados. O processor marca o
+# ticker antes de mandar a linha para o writer de dados; "ok" fica aguardando até
+# o writer confirmar a linha gravada (after_flush recebe só as linhas que
+# entraram no banco, coluna `ticker`), demais status vão no próximo flush. "ok"
+# sem confirmação (lote/linha rejeitado) é descartado no fim, e o ticker volta a
+# ser coletado. Marcação e flush podem vir de threads diferentes
+# (modules/pipeline.py).
+class Checkpoint:
+    def __init__(self, engine, processor, run_date=None, enabled=ENABLED):
+        self.engine = engine
+        self.processor = processor
+        self.run_date = run_date or date.today()
+        self.enabled = enabled
+        self.pending = []
+        self.aguardando = {}  # TICKER -> marcas "ok" esperando a linha ser gravada
+        self.lock = threading.Lock()
+        self.writer = BulkWriter(engine, TABLE, COLUMNS, conflict=("processor", "data_execucao", "ticker"))
+
+    def prune(self):
+        # Tabela criada em modules/migrations.py; aqui só a retenção
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {TABLE} WHERE data_execucao < :corte"),
+                {"corte": self.run_date - timedelta(days=RETENTION_DAYS)},
+            )
+
+    def completed(self):
+        # Uma consulta para o dia inteiro do processor
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(f"""
+                    SELECT ticker FROM {TABLE}
+                    WHERE processor = :processor AND data_execucao = :data AND status = :status
+                """),
+                {"processor": self.processor, "data": self.run_date, "status": DONE},
+            )
+            return {r[0] for r in rows}
+
+    def remaining(self, tickers):
+        if not self.enabled:
+            return tickers
+        self.prune()
+        feitos = self.completed()
+        restantes = [t for t in tickers if t not in feitos]
+        if len(restantes) < len(tickers):
+            print(
+                f"⏭️ Checkpoint {self.processor}: {len(tickers) - len(restantes)}/{len(tickers)} "
+                f"tickers já coletados hoje, faltam {len(restantes)}."
+            )
+        return restantes
+
+    # -------------------------
+    # Marcação
+    # -------------------------
+    def mark(self, ticker, status=DONE):
+        if not self.enabled:
+            return
+        row = {
+            "processor": self.processor,
+            "data_execucao": self.run_date,
+            "ticker": ticker,
+            "status": status,
+        }
+        with self.lock:
+            if status == DONE:
+                self.aguardando.setdefault(ticker.upper(), []).append(row)
+            else:
+                self.pending.append(row)
+
+    def flush(self, columns=None, gravadas=None):
+        # Chamado pelo writer de dados (after_flush) ou no fim da execução (sem args)
+        with self.lock:
+            if gravadas:
+                idx = columns.index("ticker")
+                for r in gravadas:
+                    self.pending.extend(self.aguardando.pop(str(r[idx]).upper(), []))
+            elif columns is None and self.aguardando:
+                print(
+                    f"⚠️ Checkpoint {self.processor}: {len(self.aguardando)} tickers sem linha "
+                    f"gravada, coletados de novo na próxima execução."
+                )
+                self.aguardando = {}
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+        self.writer.extend(rows)
+        self.writer.flush()
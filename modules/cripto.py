@@ -1,87 +1,280 @@
-import requests
+import contextvars
+import os
+import queue
+import threading
 import psycopg2
+from modules.archive import RawArchive
+from modules.bulk import BulkWriter
+from modules.cripto_storage import CriptoStorage
+from modules.http_client import get_session
+from modules.latest import LatestQuotes
+from modules.metrics import registry
+from modules.normalize import normalize
+from modules.ratelimit import limited, retry_throttled
 from datetime import datetime, timezone
 
+# -------------------------
+# Configuração (universe = per_page * total_pages moedas)
+# -------------------------
+PER_PAGE = int(os.getenv("CRIPTO_PER_PAGE", "100"))  # CoinGecko aceita até 250
+TOTAL_PAGES = int(os.getenv("CRIPTO_TOTAL_PAGES", "5"))
+WORKERS = int(os.getenv("CRIPTO_WORKERS", "3"))
+QUEUE_SIZE = int(os.getenv("CRIPTO_QUEUE_SIZE", "4"))  # páginas em memória no máximo
+PAGE_RETRIES = int(os.getenv("CRIPTO_PAGE_RETRIES", "3"))  # novas tentativas por página após 429/503
+# Modo daemon (maincripto.py --daemon)
+INTERVAL_MIN = float(os.getenv("CRIPTO_INTERVALO_MIN", "5"))               # entre snapshots
+MAINTENANCE_MIN = float(os.getenv("CRIPTO_MANUTENCAO_MIN", "60"))          # rollups/retenção
+
+
 class CriptoFetcher:
-    API_URL = "https://api.coingecko.com/api/v3/coins/markets"
+    API_URL = os.getenv("COINGECKO_URL", "https://api.coingecko.com/api/v3/coins/markets")
 
-    def __init__(self, per_page=100, total_pages=5):
+    def __init__(self, per_page=PER_PAGE, total_pages=TOTAL_PAGES, session=None, workers=WORKERS):
         self.per_page = per_page
         self.total_pages = total_pages
+        self.session = session or get_session("coingecko")
+        self.workers = max(1, min(workers, total_pages))
+        self.failed_pages = []
+
+    def fetch_page(self, page):
+        url = (
+            f"{self.API_URL}"
+            f"?vs_currency=usd&order=market_cap_desc"
+            f"&per_page={self.per_page}&page={page}"
+            f"&sparkline=false"
+            f"&price_change_percentage=7d,30d,1y"
+        )
+
+        def get():
+            with limited("coingecko", "markets") as obs:
+                r = self.session.get(url, timeout=10)
+                obs.bytes = len(r.content)
+                r.raise_for_status()
+                return r.json()
+
+        # Falha devolve None (página vazia é [] = fim da lista). 5xx/conexão já
+        # foram repetidos pela sessão; 429/503 são repetidos aqui, cada tentativa
+        # passando pelo limitador
+        try:
+            data = retry_throttled(get, PAGE_RETRIES)
+        except Exception as e:
+            print(f"❌ Erro ao buscar página {page}: {e}")
+            self.failed_pages.append(page)
+            return None
+        print(f"Página {page} OK ({len(data)} moedas).")
+        return data
+
+    def iter_pages(self):
+        # Workers buscam páginas em paralelo e entregam por uma fila limitada:
+        # se o consumidor (writer) atrasar, os workers esperam (backpressure)
+        fila = queue.Queue(maxsize=QUEUE_SIZE)
+        paginas = iter(range(1, self.total_pages + 1))
+        self.failed_pages = []
+        lock = threading.Lock()
+        parar = threading.Event()
+        fim = object()
+
+        def put(item):
+            while not parar.is_set():
+                try:
+                    fila.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def worker():
+            while not parar.is_set():
+                with lock:
+                    page = next(paginas, None)
+                if page is None:
+                    break
+                data = self.fetch_page(page)
+                if data:
+                    put(data)
+            put(fim)
+
+        for _ in range(self.workers):
+            ctx = contextvars.copy_context()
+            threading.Thread(target=ctx.run, args=(worker,), daemon=True).start()
+
+        try:
+            finalizados = 0
+            while finalizados < self.workers:
+                item = fila.get()
+                if item is fim:
+                    finalizados += 1
+                    continue
+                yield item
+        finally:
+            parar.set()
+
+        # Páginas perdidas aparecem no relatório em vez de sumirem em silêncio
+        registry.set_gauge("collector_pages_lost", len(self.failed_pages), upstream="coingecko")
+        if self.failed_pages:
+            print(f"⚠️ {len(self.failed_pages)} página(s) da CoinGecko perdidas: {sorted(self.failed_pages)}")
 
     def fetch(self):
         all_data = []
-        for page in range(1, self.total_pages + 1):
-            url = (
-                f"{self.API_URL}"
-                f"?vs_currency=usd&order=market_cap_desc"
-                f"&per_page={self.per_page}&page={page}"
-                f"&sparkline=false"
-                f"&price_change_percentage=7d,30d,1y"
-            )
-            try:
-                r = requests.get(url, timeout=10)
-                r.raise_for_status()
-                data = r.json()
-                all_data.extend(data)
-                print(f"Página {page} OK ({len(data)} moedas).")
-            except Exception as e:
-                print(f"❌ Erro ao buscar página {page}: {e}")
+        for data in self.iter_pages():
+            all_data.extend(data)
         return all_data
 
 
+# coluna no banco -> (tipo, chave no payload da CoinGecko); tempo_utc é do snapshot
+SCHEMA = {
+    "simbolo": ("text", ["symbol"]),
+    "nome": ("text", ["name"]),
+    "preco_atual": ("float", ["current_price"]),
+    "market_cap": ("float", ["market_cap"]),
+    "market_cap_rank": ("int", ["market_cap_rank"]),
+    "fully_diluted_valuation": ("float", ["fully_diluted_valuation"]),
+    "total_volume": ("float", ["total_volume"]),
+    "high_24h": ("float", ["high_24h"]),
+    "low_24h": ("float", ["low_24h"]),
+    "price_change_24h": ("float", ["price_change_24h"]),
+    "price_change_percentage_24h": ("float", ["price_change_percentage_24h"]),
+    "market_cap_change_24h": ("float", ["market_cap_change_24h"]),
+    "market_cap_change_percentage_24h": ("float", ["market_cap_change_percentage_24h"]),
+    "circulating_supply": ("float", ["circulating_supply"]),
+    "total_supply": ("float", ["total_supply"]),
+    "max_supply": ("float", ["max_supply"]),
+    "ath": ("float", ["ath"]),
+    "ath_change_percentage": ("float", ["ath_change_percentage"]),
+    "ath_date": ("timestamp", ["ath_date"]),
+    "atl": ("float", ["atl"]),
+    "atl_change_percentage": ("float", ["atl_change_percentage"]),
+    "atl_date": ("timestamp", ["atl_date"]),
+    "last_updated": ("timestamp", ["last_updated"]),
+    "price_change_percentage_1y_in_currency": ("float", ["price_change_percentage_1y_in_currency"]),
+    "price_change_percentage_30d_in_currency": ("float", ["price_change_percentage_30d_in_currency"]),
+    "price_change_percentage_7d_in_currency": ("float", ["price_change_percentage_7d_in_currency"]),
+}
+COLUMNS = ["tempo_utc", *SCHEMA]
+
+
 class CriptoSaver:
+    # `conn`: conexão psycopg2 na coleta; engine SQLAlchemy no replay
     def __init__(self, conn):
         self.conn = conn
 
+    def writer(self):
+        # latest_quotes na mesma transação de cada lote (símbolo repetido: fica o maior market cap)
+        return BulkWriter(
+            self.conn, "historico_cripto", COLUMNS,
+            projections=[LatestQuotes("cripto", desempate="market_cap")],
+        )
+
     def save(self, cripto_list):
-        cursor = self.conn.cursor()
+        return self.save_pages([cripto_list])
+
+    def save_pages(self, pages):
+        # Cada página vai para o writer assim que chega; todas compartilham o
+        # mesmo tempo_utc do snapshot
         tempo_utc = datetime.now(timezone.utc)
+        total = 0
+
+        writer = self.writer()
+        with RawArchive("cripto", dia=tempo_utc.date()) as arquivo:
+            for page in pages:
+                arquivo.add(page, tempo_utc=tempo_utc.isoformat())
+                writer.add_frame(normalize(SCHEMA, page, tempo_utc=tempo_utc))
+                total += len(page)
+        writer.close()
+
+        print(f"💾 {total} criptos salvas no banco.")
+        return total
+
+    def replay(self, lotes):
+        # Páginas do arquivo bruto (modules/archive.py). historico_cripto não tem
+        # chave única: cada snapshot reprocessado substitui as linhas do mesmo tempo_utc
+        from sqlalchemy import text
 
-        sql = """
-            INSERT INTO historico_cripto (
-                tempo_utc, simbolo, nome, preco_atual, market_cap,
-                market_cap_rank, fully_diluted_valuation, total_volume,
-                high_24h, low_24h, price_change_24h, price_change_percentage_24h,
-                market_cap_change_24h, market_cap_change_percentage_24h,
-                circulating_supply, total_supply, max_supply, ath,
-                ath_change_percentage, ath_date, atl, atl_change_percentage,
-                atl_date, last_updated, price_change_percentage_1y_in_currency,
-                price_change_percentage_30d_in_currency,
-                price_change_percentage_7d_in_currency
-            ) VALUES (
-                %(tempo_utc)s, %(symbol)s, %(name)s, %(current_price)s, %(market_cap)s,
-                %(market_cap_rank)s, %(fully_diluted_valuation)s, %(total_volume)s,
-                %(high_24h)s, %(low_24h)s, %(price_change_24h)s, %(price_change_percentage_24h)s,
-                %(market_cap_change_24h)s, %(market_cap_change_percentage_24h)s,
-                %(circulating_supply)s, %(total_supply)s, %(max_supply)s, %(ath)s,
-                %(ath_change_percentage)s, %(ath_date)s, %(atl)s, %(atl_change_percentage)s,
-                %(atl_date)s, %(last_updated)s, %(price_change_percentage_1y_in_currency)s,
-                %(price_change_percentage_30d_in_currency)s,
-                %(price_change_percentage_7d_in_currency)s
-            );
-        """
-
-        for item in cripto_list:
-            item["tempo_utc"] = tempo_utc
-            cursor.execute(sql, item)
-
-        self.conn.commit()
-        cursor.close()
-        print(f"💾 {len(cripto_list)} criptos salvas no banco.")
+        writer = self.writer()
+        substituidos = set()
+        for _, registros in lotes:
+            for registro in registros:
+                tempo_utc = datetime.fromisoformat(registro["tempo_utc"])
+                if tempo_utc not in substituidos:
+                    writer.flush()
+                    with self.conn.begin() as conn:
+                        conn.execute(text("DELETE FROM historico_cripto WHERE tempo_utc = :t"), {"t": tempo_utc})
+                    substituidos.add(tempo_utc)
+                writer.add_frame(normalize(SCHEMA, registro["payload"], tempo_utc=tempo_utc))
+        writer.close()
+        print(f"💾 {len(substituidos)} snapshot(s) de cripto regravados.")
 
 
 class CriptoProcessor:
-    def __init__(self, conn):
+    def __init__(self, conn, maintain=True):
         self.conn = conn
+        self.maintain = maintain
         self.fetcher = CriptoFetcher()
         self.saver = CriptoSaver(conn)
+        self.storage = CriptoStorage(conn)
 
     def run(self):
         print("\n🚀 Coletando dados de CRIPTO...")
-        dados = self.fetcher.fetch()
-        if not dados:
+        total = self.saver.save_pages(self.fetcher.iter_pages())
+        if not total:
             print("❌ Nenhum dado encontrado para cripto.")
             return
-        self.saver.save(dados)
+
+        # Partições do mês, rollups hora/dia e retenção do bruto
+        if self.maintain:
+            try:
+                self.storage.maintain()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"❌ Erro na manutenção de historico_cripto: {e}")
         print("✔ Finalizado módulo CRIPTO.")
+
+
+# -------------------------
+# Daemon
+# -------------------------
+# Um processo de longa duração no lugar de um runner novo a cada 20 min: a
+# engine (pool com pre_ping, já que o Neon derruba conexões ociosas), a sessão
+# HTTP da CoinGecko (keep-alive) e o limitador adaptativo ficam aquecidos entre
+# snapshots. Manutenção (partições, rollups, retenção) roda em intervalo próprio.
+class CriptoDaemon:
+    def __init__(self, engine, interval_min=INTERVAL_MIN, maintenance_min=MAINTENANCE_MIN, exportar=False):
+        self.engine = engine
+        self.interval = interval_min * 60
+        self.maintenance = maintenance_min * 60
+        self.exportar = exportar
+        self.fetcher = CriptoFetcher()
+
+    def snapshot(self):
+        conn = self.engine.raw_connection()
+        try:
+            processor = CriptoProcessor(conn, maintain=False)
+            processor.fetcher = self.fetcher
+            processor.run()
+        finally:
+            conn.close()  # devolve ao pool
+        # Relatório do último ciclo (sobrescrito a cada snapshot) e memória estável
+        registry.write("cripto")
+        registry.reset()
+
+    def maintain(self):
+        conn = self.engine.raw_connection()
+        try:
+            CriptoStorage(conn).maintain()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if self.exportar:
+            from modules.export import ParquetExporter
+            ParquetExporter(self.engine).run(["cripto"])
+
+    def run(self):
+        from modules.scheduler import Scheduler
+
+        agenda = Scheduler()
+        agenda.add("snapshot", self.interval, self.snapshot, imediato=True)
+        if self.maintenance > 0:
+            agenda.add("manutencao", self.maintenance, self.maintain)
+        agenda.install_signals()
+        agenda.run()
@@ -0,0 +1,241 @@
+# modules/cripto_storage.py
+import os
+from datetime import datetime, timedelta, timezone
+from modules.metrics import measure
+
+# -------------------------
+# Configuração
+# -------------------------
+TABLE = "historico_cripto"
+PARTITIONS_AHEAD = int(os.getenv("CRIPTO_PARTICOES_FUTURAS", "2"))  # meses criados adiantado
+RETENTION_DAYS = int(os.getenv("CRIPTO_RETENCAO_DIAS", "90"))       # bruto mantido após rollup
+
+
+def month_start(d):
+    return datetime(d.year, d.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(d):
+    return month_start(d.replace(day=28) + timedelta(days=4))
+
+
+def partition_name(inicio):
+    return f"{TABLE}_p{inicio:%Y_%m}"
+
+
+# -------------------------
+# Rollups (OHLC por símbolo)
+# -------------------------
+# `fonte` é a tabela de origem e `ts` sua coluna de tempo; o diário é montado a
+# partir do horário, que já é compacto. Tabelas criadas na migração 007.
+ROLLUPS = {
+    "hora": {
+        "tabela": "cripto_ohlc_hora",
+        "fonte": TABLE,
+        "ts": "tempo_utc",
+        "trunc": "hour",
+        "select": """
+            (array_agg(preco_atual ORDER BY tempo_utc))[1],
+            max(preco_atual),
+            min(preco_atual),
+            (array_agg(preco_atual ORDER BY tempo_utc DESC))[1],
+            (array_agg(total_volume ORDER BY tempo_utc DESC))[1],
+            (array_agg(market_cap ORDER BY tempo_utc DESC))[1],
+            count(*)
+        """,
+    },
+    "dia": {
+        "tabela": "cripto_ohlc_dia",
+        "fonte": "cripto_ohlc_hora",
+        "ts": "bucket",
+        "trunc": "day",
+        "select": """
+            (array_agg(abertura ORDER BY bucket))[1],
+            max(maxima),
+            min(minima),
+            (array_agg(fechamento ORDER BY bucket DESC))[1],
+            (array_agg(volume_24h ORDER BY bucket DESC))[1],
+            (array_agg(market_cap ORDER BY bucket DESC))[1],
+            sum(amostras)
+        """,
+    },
+}
+
+
+class CriptoStorage:
+    def __init__(self, conn, retention_days=RETENTION_DAYS):
+        self.conn = conn
+        self.retention_days = retention_days
+
+    def _execute(self, sql, params=None, fetch=False):
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall() if fetch else None
+        finally:
+            cur.close()
+
+    # -------------------------
+    # Particionamento mensal por tempo_utc
+    # -------------------------
+    def is_partitioned(self):
+        rows = self._execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (TABLE,), fetch=True
+        )
+        return bool(rows) and rows[0][0] == "p"
+
+    def create_partition(self, inicio):
+        fim = next_month(inicio)
+        self._execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(inicio)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+        )
+
+    def ensure_index(self):
+        # Mesmo índice da migração 003, recriado na tabela particionada nova
+        self._execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE}_simbolo_tempo_idx ON {TABLE} (simbolo, tempo_utc)"
+        )
+
+    def ensure_partitions(self, agora=None):
+        if not self.is_partitioned():
+            return
+        inicio = month_start(agora or datetime.now(timezone.utc))
+        for _ in range(PARTITIONS_AHEAD + 1):
+            self.create_partition(inicio)
+            inicio = next_month(inicio)
+        self.conn.commit()
+
+    def migrate_to_partitioned(self):
+        # Conversão única: a tabela atual vira historico_cripto_legado (mantida
+        # para conferência) e os dados são copiados para a nova tabela particionada
+        if self.is_partitioned():
+            print(f"✔ {TABLE} já é particionada.")
+            return
+
+        try:
+            self._execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legado")
+            # Nome de índice é único no schema: o da migração 003 acompanha a
+            # tabela renomeada e libera o nome para a tabela particionada
+            self._execute(
+                f"ALTER INDEX IF EXISTS {TABLE}_simbolo_tempo_idx RENAME TO {TABLE}_legado_simbolo_tempo_idx"
+            )
+            self._execute(
+                f"CREATE TABLE {TABLE} (LIKE {TABLE}_legado INCLUDING DEFAULTS) "
+                f"PARTITION BY RANGE (tempo_utc)"
+            )
+            self._execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+            primeiro = self._execute(f"SELECT min(tempo_utc) FROM {TABLE}_legado", fetch=True)[0][0]
+            inicio = month_start(primeiro or datetime.now(timezone.utc))
+            limite = next_month(datetime.now(timezone.utc))
+            while inicio <= limite:
+                self.create_partition(inicio)
+                inicio = next_month(inicio)
+
+            self._execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_legado")
+            self.ensure_index()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        print(f"✅ {TABLE} convertida para particionamento mensal ({TABLE}_legado pode ser removida).")
+
+    # -------------------------
+    # Rollups incrementais
+    # -------------------------
+    def watermark(self, nivel):
+        rows = self._execute("SELECT ate FROM cripto_rollup_estado WHERE nivel = %s", (nivel,), fetch=True)
+        return rows[0][0] if rows else None
+
+    def rollup(self, nivel):
+        cfg = ROLLUPS[nivel]
+        # Só buckets completos: até o início da hora/dia corrente
+        ate = self._execute(f"SELECT date_trunc('{cfg['trunc']}', now())", fetch=True)[0][0]
+        desde = self.watermark(nivel)
+        if desde is None:
+            desde = self._execute(
+                f"SELECT date_trunc('{cfg['trunc']}', min({cfg['ts']})) FROM {cfg['fonte']}", fetch=True
+            )[0][0]
+        if desde is None or desde >= ate:
+            return 0
+
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"""
+                INSERT INTO {cfg['tabela']} (
+                    simbolo, bucket, abertura, maxima, minima, fechamento,
+                    volume_24h, market_cap, amostras
+                )
+                SELECT simbolo, date_trunc('{cfg['trunc']}', {cfg['ts']}) AS b, {cfg['select']}
+                FROM {cfg['fonte']}
+                WHERE {cfg['ts']} >= %(desde)s AND {cfg['ts']} < %(ate)s
+                GROUP BY simbolo, b
+                ON CONFLICT (simbolo, bucket) DO UPDATE SET
+                    abertura = EXCLUDED.abertura,
+                    maxima = EXCLUDED.maxima,
+                    minima = EXCLUDED.minima,
+                    fechamento = EXCLUDED.fechamento,
+                    volume_24h = EXCLUDED.volume_24h,
+                    market_cap = EXCLUDED.market_cap,
+                    amostras = EXCLUDED.amostras
+            """, {"desde": desde, "ate": ate})
+            linhas = cur.rowcount
+            cur.execute("""
+                INSERT INTO cripto_rollup_estado (nivel, ate) VALUES (%s, %s)
+                ON CONFLICT (nivel) DO UPDATE SET ate = EXCLUDED.ate
+            """, (nivel, ate))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+        return linhas
+
+    # -------------------------
+    # Retenção do bruto (só o que já virou rollup)
+    # -------------------------
+    def prune(self):
+        wm = self.watermark("hora")
+        if wm is None or self.retention_days <= 0:
+            return 0
+        corte = min(wm, datetime.now(timezone.utc) - timedelta(days=self.retention_days))
+
+        if not self.is_partitioned():
+            cur = self.conn.cursor()
+            try:
+                cur.execute(f"DELETE FROM {TABLE} WHERE tempo_utc < %s", (corte,))
+                removidas = cur.rowcount
+                self.conn.commit()
+            finally:
+                cur.close()
+            return removidas
+
+        # Particionada: descarta partições mensais inteiras abaixo do corte
+        particoes = self._execute(f"""
+            SELECT c.relname
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('{TABLE}')
+        """, fetch=True)
+        removidas = 0
+        for (nome,) in particoes:
+            if not nome.startswith(f"{TABLE}_p"):
+                continue
+            inicio = datetime.strptime(nome[len(TABLE) + 2:], "%Y_%m").replace(tzinfo=timezone.utc)
+            if next_month(inicio) <= corte:
+                self._execute(f"DROP TABLE IF EXISTS {nome}")
+                removidas += 1
+        self.conn.commit()
+        return removidas
+
+    def maintain(self):
+        with measure("postgres", "manutencao:historico_cripto"):
+            self.ensure_partitions()
+            hora = self.rollup("hora")
+            dia = self.rollup("dia")
+            removidas = self.prune()
+        print(
+            f"🧮 Rollups cripto: {hora} buckets/hora, {dia} buckets/dia; "
+            f"retenção ({self.retention_days}d) descartou {removidas} lote(s)/partição(ões)."
+        )
@@ -0,0 +1,49 @@
+# modules/db.py
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# -------------------------
+# Configuração
+# -------------------------
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Escritas acontecem na thread de cada processor: 1 conexão por processor + folga
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
+
+
+# -------------------------
+# Engine única do coletor
+# -------------------------
+def build_engine(url=None, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW):
+    return create_engine(
+        url or DATABASE_URL,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,   # Neon derruba conexões ociosas
+        pool_recycle=300,
+    )
+
+
+def check_connection(engine):
+    # Abre a primeira conexão do pool (ela fica aquecida para os processors)
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        agora = conn.execute(text("SELECT NOW()")).scalar()
+    return agora, time.perf_counter() - start
+
+
+def report_startup(etapas):
+    # Tempo de import/conexão no log e, no Actions, no resumo do job
+    linha = " | ".join(f"{nome}: {segundos:.2f}s" for nome, segundos in etapas.items())
+    print(f"⏱️ Startup — {linha}")
+
+    summary = os.getenv("GITHUB_STEP_SUMMARY")
+    if summary:
+        with open(summary, "a") as f:
+            f.write("### Startup\n\n| etapa | segundos |\n|---|---|\n")
+            for nome, segundos in etapas.items():
+                f.write(f"| {nome} | {segundos:.2f} |\n")
+            f.write("\n")
@@ -0,0 +1,175 @@
+# modules/derived.py
+# Métricas derivadas calculadas a partir do histórico de preços já gravado, em vez
+# de virem do .info de cada ticker: retornos em janela, médias móveis e máximas/
+# mínimas de 52 semanas. Roda depois da coleta, uma consulta por classe e
+# operações vetorizadas (pandas, agrupadas por ticker) sobre o universo inteiro.
+#
+# Valor calculado localmente prevalece; sem histórico suficiente para a janela o
+# valor fica NULL e o coalesce do upsert mantém o que veio do upstream.
+#
+# Uso direto:  python -m modules.derived [fiis] [bdr] [etf] [--dias N]
+import os
+from datetime import date, timedelta
+from sqlalchemy import text
+from modules.bulk import BulkWriter
+from modules.export import mark_stale
+from modules.metrics import measure
+
+# -------------------------
+# Configuração
+# -------------------------
+ENABLED = os.getenv("METRICAS_DERIVADAS", "1") != "0"
+LOOKBACK_DAYS = 400  # histórico lido: cobre 12 meses de retorno e 200 pregões de média
+TOLERANCE_DAYS = 7  # folga para feriados/dias sem coleta no início da janela
+
+# classe -> tabela, colunas de data/preço e métricas (coluna -> (tipo, janela)).
+# retorno/maxima/minima: janela em dias corridos; media: em pregões (dias úteis).
+# Retornos em fração (0.12 = 12%), como o 52WeekChange do Yahoo.
+METRICS = {
+    "fiis": {
+        "tabela": "historico_fiis", "data": "data_registro", "preco": "valor",
+        "metricas": {"rentabilidade_12m": ("retorno", 365)},
+    },
+    "bdr": {
+        "tabela": "historico_bdr", "data": "data_registro", "preco": "preco_atual",
+        "metricas": {
+            "preco_media_50d": ("media", 50),
+            "preco_media_200d": ("media", 200),
+            "preco_52_semana_alta": ("maxima", 365),
+            "preco_52_semana_baixa": ("minima", 365),
+        },
+    },
+    "etf": {
+        "tabela": "historico_etf", "data": "data_registro", "preco": "preco_atual",
+        "metricas": {
+            "variacao_1m": ("retorno", 30),
+            "variacao_6m": ("retorno", 182),
+            "variacao_12m": ("retorno", 365),
+            "fifty_two_week_high": ("maxima", 365),
+            "fifty_two_week_low": ("minima", 365),
+        },
+    },
+}
+
+
+class DerivedMetrics:
+    def __init__(self, engine):
+        self.engine = engine
+
+    # -------------------------
+    # Leitura
+    # -------------------------
+    def load(self, cfg, desde):
+        import pandas as pd
+
+        sql = (
+            f"SELECT ticker, {cfg['data']} AS data, {cfg['preco']} AS preco FROM {cfg['tabela']} "
+            f"WHERE {cfg['data']} >= :inicio AND {cfg['preco']} > 0"
+        )
+        with self.engine.connect() as conn:
+            df = pd.read_sql(text(sql), conn, params={"inicio": desde - timedelta(days=LOOKBACK_DAYS)})
+        df["data"] = pd.to_datetime(df["data"])
+        df["preco"] = pd.to_numeric(df["preco"], errors="coerce").astype("float64")  # NUMERIC -> double
+        return df.sort_values(["ticker", "data"], ignore_index=True)
+
+    # -------------------------
+    # Janelas (todas as séries de uma vez, agrupadas por ticker)
+    # -------------------------
+    def retorno(self, df, dias):
+        # Preço do último registro até `dias` atrás (merge_asof por ticker)
+        import pandas as pd
+
+        alvo = df[["ticker"]].assign(_linha=df.index, data=df["data"] - pd.Timedelta(days=dias))
+        base = df[["ticker", "data", "preco"]]
+        m = pd.merge_asof(
+            alvo.sort_values("data"), base.sort_values("data"), on="data", by="ticker",
+            direction="backward", tolerance=pd.Timedelta(days=TOLERANCE_DAYS),
+        )
+        preco_base = pd.Series(m["preco"].to_numpy(), index=m["_linha"]).reindex(df.index)
+        return df["preco"] / preco_base - 1
+
+    def extremo(self, df, dias, funcao):
+        # Máxima/mínima em janela de dias corridos; só com a janela coberta pelo histórico
+        import pandas as pd
+
+        janela = df.set_index("data").groupby("ticker")["preco"].rolling(f"{dias}D")
+        valores = pd.Series(getattr(janela, funcao)().to_numpy(), index=df.index)
+        inicio = df.groupby("ticker")["data"].transform("min")
+        coberta = df["data"] - inicio >= pd.Timedelta(days=dias - TOLERANCE_DAYS)
+        return valores.where(coberta)
+
+    def media(self, df, pregoes):
+        # Média dos últimos N pregões; fins de semana repetem o preço de sexta e
+        # ficam fora da janela (recebem a média de sexta)
+        import pandas as pd
+
+        uteis = df[df["data"].dt.dayofweek < 5]
+        janela = uteis.groupby("ticker")["preco"].rolling(pregoes, min_periods=pregoes)
+        valores = pd.Series(janela.mean().to_numpy(), index=uteis.index).reindex(df.index)
+        return valores.groupby(df["ticker"]).ffill()
+
+    def compute(self, df, metricas):
+        out = df[["ticker", "data"]].copy()
+        for coluna, (tipo, janela) in metricas.items():
+            if tipo == "retorno":
+                out[coluna] = self.retorno(df, janela)
+            elif tipo == "media":
+                out[coluna] = self.media(df, janela)
+            else:
+                out[coluna] = self.extremo(df, janela, "max" if tipo == "maxima" else "min")
+        return out
+
+    # -------------------------
+    # Gravação
+    # -------------------------
+    def update(self, classe, desde=None):
+        cfg = METRICS[classe]
+        desde = desde or date.today()
+        metricas = list(cfg["metricas"])
+
+        with measure("postgres", f"derivadas:{classe}") as obs:
+            df = self.load(cfg, desde)
+            if df.empty:
+                print(f"⚠️ Sem histórico de {classe} para métricas derivadas.")
+                return 0
+            out = self.compute(df, cfg["metricas"])
+            out = out[out["data"].dt.date >= desde].dropna(subset=metricas, how="all")
+            out = out.rename(columns={"data": cfg["data"]})
+            out[cfg["data"]] = out[cfg["data"]].dt.date
+
+            # Só atualiza linhas existentes (chave lida da própria tabela)
+            writer = BulkWriter(
+                self.engine, cfg["tabela"], ["ticker", cfg["data"], *metricas],
+                conflict=("ticker", cfg["data"]), coalesce=metricas,
+            )
+            with writer:
+                writer.add_frame(out)
+            obs.rows = len(out)
+        # Dias anteriores (--dias N) podem já estar no Parquet: reexportados
+        mark_stale(self.engine, classe, [d for d in out[cfg["data"]].unique() if d < date.today()])
+
+        print(f"📐 {classe}: métricas derivadas de {df['ticker'].nunique()} tickers ({len(out)} linhas).")
+        return len(out)
+
+    def run(self, classes=None, desde=None):
+        for classe in classes or list(METRICS):
+            if classe not in METRICS:
+                continue
+            try:
+                self.update(classe, desde)
+            except Exception as e:
+                print(f"❌ Erro nas métricas derivadas de {classe}: {e}")
+
+
+if __name__ == "__main__":
+    import sys
+    from modules.db import build_engine
+    from modules.metrics import set_processor
+
+    dias = int(sys.argv[sys.argv.index("--dias") + 1]) if "--dias" in sys.argv else 0
+    engine = build_engine()
+    set_processor("derivadas")
+    DerivedMetrics(engine).run(
+        [c for c in sys.argv[1:] if c in METRICS] or None, date.today() - timedelta(days=dias),
+    )
+    engine.dispose()
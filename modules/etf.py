@@ -1,148 +1,80 @@
 # modules/etf.py
-import os
-import yfinance as yf
-import requests
-from sqlalchemy import create_engine, text
-from datetime import datetime
-from dotenv import load_dotenv
-import time
+from modules import yahoo
+from modules.brapi import BRAPI_TOKEN, BrapiClient
+from modules.bulk import BulkWriter
+from modules.executor import FetchExecutor
+from modules.latest import LatestQuotes
+from modules.normalize import normalize
+from modules.pipeline import BatchCollector, load_tickers
+from modules.sources import SourceFallback
 
-load_dotenv()
-DATABASE_URL = os.environ.get("DATABASE_URL")
-BRAPI_TOKEN = os.environ.get("BRAPI_TOKEN")
-BRAPI_URL = "https://brapi.dev/api/quote/"
-engine = create_engine(DATABASE_URL)
 TICKERS_TABLE = "tickers_etf"
-SLEEP_BETWEEN = 0.3
+# coluna -> (tipo, chaves de origem em ordem de preferência); ver modules/normalize.py
+# (brapi só é consultada para ETFs brasileiros, e só quando o Yahoo deixa de fora
+# algum campo de REQUIRED)
+SCHEMA = {
+    "preco_atual": ("float", ["yahoo.currentPrice", "yahoo.regularMarketPrice", "brapi.regularMarketPrice"]),
+    "variacao_dia": ("float", ["yahoo.regularMarketChangePercent"]),
+    "variacao_1m": ("float", []),
+    "variacao_6m": ("float", []),
+    "variacao_12m": ("float", ["yahoo.52WeekChange"]),
+    "fifty_two_week_low": ("float", ["yahoo.fiftyTwoWeekLow", "brapi.fiftyTwoWeekLow"]),
+    "fifty_two_week_high": ("float", ["yahoo.fiftyTwoWeekHigh", "brapi.fiftyTwoWeekHigh"]),
+    "p_l": ("float", ["yahoo.trailingPE", "brapi.priceEarnings"]),
+    "p_vp": ("float", ["yahoo.priceToBook"]),
+    "dividend_yield": ("float", ["yahoo.dividendYield", "brapi.dividendYield"]),
+    "beta": ("float", ["yahoo.beta"]),
+    "volume": ("float", ["yahoo.volume", "brapi.regularMarketVolume"]),
+    "market_cap": ("float", ["yahoo.marketCap", "brapi.marketCap"]),
+    "setor": ("text", ["yahoo.category", "yahoo.industry"]),
+}
+FIELDS = ["ticker", *SCHEMA, "pais", "data_registro"]
+# Sem estes campos o ETF brasileiro passa pelo fallback da brapi (modules/sources.py)
+REQUIRED = ["preco_atual", "volume", "fifty_two_week_low", "fifty_two_week_high"]
 
 class ETFProcessor:
-    def __init__(self, engine):
+    def __init__(self, engine, executor=None, brapi=None):
         self.engine = engine
+        self.executor = executor or FetchExecutor()
+        self.brapi = brapi or BrapiClient(token=BRAPI_TOKEN)
 
     def is_brazil_etf(self, ticker):
         return ticker.upper().endswith("11")
 
-    def fetch_brapi(self, ticker):
-        if not BRAPI_TOKEN:
-            return {}
-        try:
-            url = f"{BRAPI_URL}{ticker}?token={BRAPI_TOKEN}"
-            r = requests.get(url, timeout=10).json()
-            return r.get("results", [{}])[0]
-        except Exception as e:
-            print(f"Erro BRAPI ETF {ticker}:", e)
-            return {}
-
-    def fetch_yahoo(self, ticker):
-        try:
-            return yf.Ticker(ticker).info or {}
-        except Exception as e:
-            print(f"Erro Yahoo ETF {ticker}:", e)
-            return {}
-
     def get_data(self, ticker):
-        is_br = self.is_brazil_etf(ticker)
-        yf_ticker = ticker + ".SA" if is_br else ticker
-
-        yahoo = self.fetch_yahoo(yf_ticker)
-        brapi = self.fetch_brapi(ticker) if is_br else {}
-
-        preco_atual = (
-            yahoo.get("currentPrice")
-            or yahoo.get("regularMarketPrice")
-            or brapi.get("regularMarketPrice")
+        # Payload bruto por fonte; a conversão de tipos é feita em lote em frame
+        return {"yahoo": yahoo.info(yahoo.sa(ticker) if self.is_brazil_etf(ticker) else ticker)}
+
+    def fallback(self):
+        fontes = {"brapi": self.brapi.quote_many} if BRAPI_TOKEN else {}
+        return SourceFallback("ETF", SCHEMA, REQUIRED, fontes, elegivel={"brapi": self.is_brazil_etf})
+
+    def writer(self, **kwargs):
+        # Upsert por (ticker, data_registro); schema em modules/migrations.py
+        return BulkWriter(
+            self.engine, "historico_etf", FIELDS,
+            conflict=("ticker", "data_registro"), projections=[LatestQuotes("etf")], **kwargs,
         )
-        if not preco_atual:
-            return None
-
-        return {
-            "ticker": ticker.upper(),
-            "preco_atual": preco_atual,
-            "variacao_dia": yahoo.get("regularMarketChangePercent"),
-            "variacao_12m": yahoo.get("52WeekChange"),
-            "variacao_1m": None,
-            "variacao_6m": None,
-            "fifty_two_week_low": yahoo.get("fiftyTwoWeekLow") or brapi.get("fiftyTwoWeekLow"),
-            "fifty_two_week_high": yahoo.get("fiftyTwoWeekHigh") or brapi.get("fiftyTwoWeekHigh"),
-            "p_l": brapi.get("priceEarnings") or yahoo.get("trailingPE"),
-            "p_vp": yahoo.get("priceToBook"),
-            "dividend_yield": yahoo.get("dividendYield") or brapi.get("dividendYield"),
-            "beta": yahoo.get("beta"),
-            "volume": yahoo.get("volume") or brapi.get("regularMarketVolume"),
-            "market_cap": yahoo.get("marketCap") or brapi.get("marketCap"),
-            "setor": yahoo.get("category") or yahoo.get("industry"),
-            "pais": "BR" if is_br else "US",
-            "data_registro": datetime.now().date()
-        }
 
-    def run(self):
-        # Criar tabela sem UNIQUE e sem conflito
-        with self.engine.begin() as conn:
-            conn.exec_driver_sql("""
-            CREATE TABLE IF NOT EXISTS historico_etf (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT,
-                preco_atual NUMERIC,
-                variacao_dia NUMERIC,
-                variacao_1m NUMERIC,
-                variacao_6m NUMERIC,
-                variacao_12m NUMERIC,
-                fifty_two_week_low NUMERIC,
-                fifty_two_week_high NUMERIC,
-                p_l NUMERIC,
-                p_vp NUMERIC,
-                dividend_yield NUMERIC,
-                beta NUMERIC,
-                volume NUMERIC,
-                market_cap NUMERIC,
-                setor TEXT,
-                pais TEXT,
-                data_registro DATE
-            )
-            """)
+    def frame(self, lote, dia):
+        import numpy as np
 
-        # Buscar tickers
-        with self.engine.begin() as conn:
-            tickers = [
-                r[0] for r in conn.execute(text(f"SELECT ticker FROM {TICKERS_TABLE}")).fetchall()
-            ]
+        df = normalize(SCHEMA, [p for _, p in lote], ticker=[t.upper() for t, _ in lote], data_registro=dia)
+        df["pais"] = np.where(df["ticker"].str.endswith("11"), "BR", "US")
+        return df
 
-        # SQL simples (insere sempre)
-        insert_sql = text("""
-        INSERT INTO historico_etf (
-            ticker, preco_atual, variacao_dia, variacao_1m, variacao_6m, variacao_12m,
-            fifty_two_week_low, fifty_two_week_high, p_l, p_vp, dividend_yield,
-            beta, volume, market_cap, setor, pais, data_registro
+    def collector(self, fallback=None):
+        return BatchCollector(
+            self.engine, "etf", self.get_data, self.frame, self.writer, "preco_atual",
+            rotulo="ETFs", executor=self.executor, fallback=fallback,
         )
-        VALUES (
-            :ticker, :preco_atual, :variacao_dia, :variacao_1m, :variacao_6m, :variacao_12m,
-            :fifty_two_week_low, :fifty_two_week_high, :p_l, :p_vp, :dividend_yield,
-            :beta, :volume, :market_cap, :setor, :pais, :data_registro
-        )
-        """)
-
-        fields = [
-            "ticker", "preco_atual", "variacao_dia", "variacao_1m", "variacao_6m",
-            "variacao_12m", "fifty_two_week_low", "fifty_two_week_high",
-            "p_l", "p_vp", "dividend_yield", "beta", "volume", "market_cap",
-            "setor", "pais", "data_registro"
-        ]
-
-        # Loop de processamento
-        for i, ticker in enumerate(tickers, start=1):
-            print(f"[{i}/{len(tickers)}] Processando {ticker}...")
 
-            data = self.get_data(ticker)
-            if not data:
-                print(f"⚠️ Sem dados para {ticker}")
-                continue
+    def replay(self, lotes):
+        self.collector().replay(lotes)
 
-            safe_data = {f: data.get(f) for f in fields}
-
-            with self.engine.begin() as conn:
-                conn.execute(insert_sql, safe_data)
-
-            print(f"✅ {ticker} registrado.")
-            time.sleep(SLEEP_BETWEEN)
+    def run(self):
+        self.collector(self.fallback()).run(load_tickers(self.engine, TICKERS_TABLE))
+        if BRAPI_TOKEN:
+            print(f"BRAPI: {self.brapi.requests_made} requisições.")
 
         print("=== Processamento de ETFs finalizado ===")
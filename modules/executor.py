@@ -0,0 +1,71 @@
+# modules/executor.py
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from modules.metrics import measure
+
+# -------------------------
+# Configuração
+# -------------------------
+# Teto de threads; a concorrência efetiva por upstream é o limite adaptativo
+# (AIMD) de modules.ratelimit, que cresce até onde o host aguenta
+MAX_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+# Orçamento global: soma de fetches simultâneos entre todos os processors
+MAX_TOTAL = int(os.getenv("FETCH_MAX_TOTAL", "32"))
+# Resultados prontos além dos workers ocupados; se o consumidor (normalização/
+# gravação) atrasar, novos fetches esperam em vez de acumular em memória
+BACKLOG = int(os.getenv("FETCH_BACKLOG", "16"))
+_budget = threading.BoundedSemaphore(MAX_TOTAL)
+
+
+def _run_with_budget(fn, item):
+    with _budget:
+        # Latência por ticker (fetch completo, todas as fontes)
+        with measure("ticker", fn.__name__):
+            return fn(item)
+
+
+# -------------------------
+# Executor de coleta
+# -------------------------
+# Roda `fn(item)` em paralelo e devolve (item, resultado, erro) na ordem em que
+# terminam. O ritmo por upstream fica a cargo de modules.ratelimit.limited(),
+# que envolve cada requisição dentro do fetch. No máximo workers + backlog
+# itens ficam submetidos por vez; interromper o consumo cancela o resto.
+class FetchExecutor:
+    def __init__(self, max_workers=MAX_WORKERS, backlog=BACKLOG):
+        self.max_workers = max_workers
+        self.backlog = backlog
+
+    def map(self, fn, items):
+        items = list(items)
+        if not items:
+            return
+        workers = min(self.max_workers, len(items))
+        janela = workers + max(0, self.backlog)
+        pendentes = iter(items)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {}
+
+        def submit():
+            for item in pendentes:
+                # copy_context: o processor corrente (métricas) segue para a thread
+                futures[pool.submit(contextvars.copy_context().run, _run_with_budget, fn, item)] = item
+                if len(futures) >= janela:
+                    return
+
+        try:
+            submit()
+            while futures:
+                prontos, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in prontos:
+                    item = futures.pop(future)
+                    try:
+                        resultado, erro = future.result(), None
+                    except Exception as e:
+                        resultado, erro = None, e
+                    yield item, resultado, erro
+                    submit()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,299 @@
+# modules/export.py
+# Exportação incremental do histórico para Parquet (análises/backtests fora do Neon).
+#
+# Layout (particionamento estilo Hive, legível por pyarrow/duckdb/polars/spark):
+#   <EXPORT_DIR>/classe=acoes/dia=2024-05-02/part-0.parquet
+#   <EXPORT_DIR>/classe=cripto/dia=2024-05-02/part-20240502T143000123456.parquet
+#   <EXPORT_DIR>/_watermarks.json
+#
+# Upserts em dias já exportados (replay do arquivo bruto, métricas derivadas
+# recalculadas) não mudam id nem passam da marca d'água: quem regrava marca o dia
+# em export_pendente (mark_stale) e a partição inteira é reescrita na próxima
+# exportação.
+#
+# Uso direto:  python -m modules.export [acoes] [fiis] [bdr] [etf] [cripto]
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import bindparam, text
+from modules.bulk import BulkWriter
+from modules.metrics import measure
+
+# -------------------------
+# Configuração
+# -------------------------
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join("data", "parquet"))
+COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))  # linhas lidas do banco por vez
+SNAPSHOT_DELAY_MIN = int(os.getenv("EXPORT_CRIPTO_ATRASO_MIN", "10"))
+PENDING_TABLE = "export_pendente"  # modules/migrations.py
+
+# classe -> tabela de origem, coluna de data da partição e tipos que não são numéricos.
+# Tabelas diárias têm upsert (o dia pode mudar): a partição inteira é reescrita.
+# historico_cripto é só append: cada execução acrescenta um arquivo novo por dia.
+DATASETS = {
+    "acoes": {"tabela": "historico_acoes", "data": "data", "texto": ["ticker"], "datas": ["dividend_date"]},
+    "fiis": {"tabela": "historico_fiis", "data": "data_registro", "texto": ["ticker", "setor"]},
+    "bdr": {
+        "tabela": "historico_bdr", "data": "data_registro",
+        "texto": ["ticker", "setor", "industria", "nome_empresa"],
+    },
+    "etf": {"tabela": "historico_etf", "data": "data_registro", "texto": ["ticker", "setor", "pais"]},
+    "cripto": {
+        "tabela": "historico_cripto", "data": "tempo_utc", "texto": ["simbolo", "nome"],
+        "tempos": ["ath_date", "atl_date", "last_updated"], "append": True,
+    },
+}
+
+
+def mark_stale(engine, classe, dias):
+    # Dias regravados fora da ordem de inserção: reexportados na próxima execução
+    dias = sorted(set(dias))
+    if not dias:
+        return
+    writer = BulkWriter(engine, PENDING_TABLE, ["classe", "dia"], conflict=("classe", "dia"), update=[])
+    writer.extend({"classe": classe, "dia": d} for d in dias)
+    writer.flush()
+
+
+class ParquetExporter:
+    def __init__(self, engine, pasta=EXPORT_DIR, chunksize=CHUNK_SIZE):
+        self.engine = engine
+        self.pasta = pasta
+        self.chunksize = chunksize
+
+    # -------------------------
+    # Marcas d'água por classe
+    # -------------------------
+    @property
+    def watermarks_path(self):
+        return os.path.join(self.pasta, "_watermarks.json")
+
+    def load_watermarks(self):
+        try:
+            with open(self.watermarks_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_watermarks(self, watermarks):
+        os.makedirs(self.pasta, exist_ok=True)
+        tmp = self.watermarks_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(tmp, self.watermarks_path)
+
+    def query(self, cfg, wm):
+        tabela, col = cfg["tabela"], cfg["data"]
+        if cfg.get("append"):
+            # Snapshots recentes podem estar no meio da gravação (lotes de 500)
+            params = {"corte": datetime.now(timezone.utc) - timedelta(minutes=SNAPSHOT_DELAY_MIN)}
+            filtro = f"{col} < :corte"
+            if wm:
+                filtro += f" AND {col} > :ate"
+                params["ate"] = datetime.fromisoformat(wm["ate"])
+            return f"SELECT * FROM {tabela} WHERE {filtro} ORDER BY {col}", params
+
+        if not wm:
+            return f"SELECT * FROM {tabela} WHERE {col} IS NOT NULL ORDER BY {col}", {}
+        # Dias com linhas novas (inclusive backfill de datas antigas, via id) e o
+        # último dia exportado, que ainda pode ter recebido upserts
+        return (
+            f"""
+            SELECT * FROM {tabela}
+            WHERE {col} IN (SELECT DISTINCT {col} FROM {tabela} WHERE id > :id)
+               OR {col} >= :data
+            ORDER BY {col}
+            """,
+            {"id": wm["id"], "data": date.fromisoformat(wm["data"])},
+        )
+
+    # -------------------------
+    # Dias marcados para reexportação
+    # -------------------------
+    def pending_days(self, classe):
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT dia FROM {PENDING_TABLE} WHERE classe = :classe"), {"classe": classe},
+            )
+            return sorted(d if isinstance(d, date) else date.fromisoformat(d) for (d,) in rows)
+
+    def clear_pending(self, classe, dias):
+        if not dias:
+            return
+        sql = text(f"DELETE FROM {PENDING_TABLE} WHERE classe = :classe AND dia IN :dias")
+        with self.engine.begin() as conn:
+            conn.execute(sql.bindparams(bindparam("dias", expanding=True)), {"classe": classe, "dias": dias})
+
+    def reexport(self, classe, cfg, dias, wm, conn):
+        # Partição inteira reescrita; o que passou da marca d'água fica para a
+        # passada incremental (append: só até o último instante já exportado)
+        import pandas as pd
+
+        tabela, col = cfg["tabela"], cfg["data"]
+        linhas = 0
+        for dia in dias:
+            if cfg.get("append"):
+                inicio = datetime(dia.year, dia.month, dia.day, tzinfo=timezone.utc)
+                ate = datetime.fromisoformat(wm["ate"])
+                if inicio > ate:
+                    continue
+                sql = f"SELECT * FROM {tabela} WHERE {col} >= :inicio AND {col} < :fim AND {col} <= :ate ORDER BY {col}"
+                params = {"inicio": inicio, "fim": inicio + timedelta(days=1), "ate": ate}
+            else:
+                if dia >= date.fromisoformat(wm["data"]):
+                    continue
+                sql, params = f"SELECT * FROM {tabela} WHERE {col} = :dia", {"dia": dia}
+
+            destino = os.path.join(self.pasta, f"classe={classe}", f"dia={dia.isoformat()}")
+            shutil.rmtree(destino, ignore_errors=True)
+            df = pd.read_sql(text(sql), conn, params=params)
+            if df.empty:
+                continue
+            df = self.normalize(df, cfg)
+            nome = f"part-{df[col].min():%Y%m%dT%H%M%S%f}.parquet" if cfg.get("append") else "part-0.parquet"
+            self.write_day(classe, cfg, dia, df, nome)
+            linhas += len(df)
+        return linhas
+
+    # -------------------------
+    # Tipos colunares
+    # -------------------------
+    def is_timestamp(self, c, cfg):
+        return (c == cfg["data"] and cfg.get("append")) or c in cfg.get("tempos", [])
+
+    def normalize(self, df, cfg):
+        import pandas as pd
+
+        df = df.drop(columns=["id"], errors="ignore")
+        for c in df.columns:
+            if c in cfg["texto"]:
+                continue
+            if self.is_timestamp(c, cfg):
+                df[c] = pd.to_datetime(df[c], utc=True, errors="coerce")
+            elif c == cfg["data"] or c in cfg.get("datas", []):
+                df[c] = pd.to_datetime(df[c], errors="coerce")
+            else:
+                df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")  # NUMERIC -> double
+        return df
+
+    def schema(self, columns, cfg):
+        # Schema fixo por classe: todas as partições são lidas como um único dataset
+        # (texto é codificado em dicionário pelo próprio Parquet)
+        import pyarrow as pa
+
+        campos = []
+        for c in columns:
+            if c in cfg["texto"]:
+                tipo = pa.string()
+            elif self.is_timestamp(c, cfg):
+                tipo = pa.timestamp("us", tz="UTC")
+            elif c == cfg["data"] or c in cfg.get("datas", []):
+                tipo = pa.date32()
+            else:
+                tipo = pa.float64()
+            campos.append((c, tipo))
+        return pa.schema(campos)
+
+    def iter_days(self, chunks, cfg):
+        # Leitura em blocos ordenados pela data; um dia só é entregue completo
+        import pandas as pd
+
+        pendente = None
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            df = self.normalize(chunk, cfg)
+            if pendente is not None:
+                df = pd.concat([pendente, df], ignore_index=True)
+            dias = df[cfg["data"]].dt.date
+            ultimo = dias.iloc[-1]
+            completos = dias != ultimo
+            for dia, grupo in df[completos].groupby(dias[completos], sort=True):
+                yield dia, grupo
+            pendente = df[~completos]
+        if pendente is not None and not pendente.empty:
+            yield pendente[cfg["data"]].dt.date.iloc[0], pendente
+
+    def write_day(self, classe, cfg, dia, df, nome):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        destino = os.path.join(self.pasta, f"classe={classe}", f"dia={dia.isoformat()}")
+        os.makedirs(destino, exist_ok=True)
+        path = os.path.join(destino, nome)
+        tmp = path + ".tmp"
+        tabela = pa.Table.from_pandas(df, schema=self.schema(df.columns, cfg), preserve_index=False)
+        pq.write_table(tabela, tmp, compression=COMPRESSION)
+        os.replace(tmp, path)
+
+    # -------------------------
+    # Exportação
+    # -------------------------
+    def export(self, classe, watermarks):
+        import pandas as pd
+
+        cfg = DATASETS[classe]
+        wm = watermarks.get(classe)
+        sql, params = self.query(cfg, wm)
+        pendentes = self.pending_days(classe)
+        linhas = dias = 0
+        ultimo = None
+
+        with measure("parquet", f"export:{classe}") as obs, self.engine.connect() as conn:
+            if pendentes and wm:
+                linhas += self.reexport(classe, cfg, pendentes, wm, conn)
+                print(f"♻️ Parquet {classe}: {len(pendentes)} dia(s) regravado(s) no banco reexportado(s).")
+            if not cfg.get("append"):
+                # Lido antes dos dados: o que entrar durante a exportação fica para a próxima
+                max_id = conn.execute(text(f"SELECT MAX(id) FROM {cfg['tabela']}")).scalar() or 0
+            chunks = pd.read_sql(text(sql), conn, params=params, chunksize=self.chunksize)
+            for dia, df in self.iter_days(chunks, cfg):
+                # Append: nome pelo primeiro instante do arquivo (refazer uma
+                # exportação interrompida sobrescreve em vez de duplicar)
+                if cfg.get("append"):
+                    nome = f"part-{df[cfg['data']].min():%Y%m%dT%H%M%S%f}.parquet"
+                else:
+                    nome = "part-0.parquet"
+                self.write_day(classe, cfg, dia, df, nome)
+                linhas += len(df)
+                dias += 1
+                ultimo = df[cfg["data"]].max() if cfg.get("append") else dia
+            obs.rows = linhas
+
+        if ultimo is not None:
+            if cfg.get("append"):
+                watermarks[classe] = {"ate": ultimo.isoformat()}
+            else:
+                watermarks[classe] = {"id": max_id, "data": ultimo.isoformat()}
+        # Sem marca d'água a exportação completa já cobriu os dias pendentes
+        self.clear_pending(classe, pendentes)
+        return linhas, dias
+
+    def run(self, classes=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("⚠️ pyarrow não instalado; exportação Parquet ignorada.")
+            return
+
+        watermarks = self.load_watermarks()
+        for classe in classes or list(DATASETS):
+            try:
+                linhas, dias = self.export(classe, watermarks)
+            except Exception as e:
+                print(f"❌ Erro ao exportar {classe} para Parquet: {e}")
+                continue
+            # Marca d'água só avança depois dos arquivos gravados
+            self.save_watermarks(watermarks)
+            print(f"📦 Parquet {classe}: {linhas} linhas em {dias} partição(ões) de data.")
+
+
+if __name__ == "__main__":
+    import sys
+    from modules.db import build_engine
+
+    engine = build_engine()
+    ParquetExporter(engine).run([c for c in sys.argv[1:] if c in DATASETS] or None)
+    engine.dispose()
@@ -0,0 +1,197 @@
+# modules/failures.py
+# Registro persistente de falhas por (processor, ticker): tickers que voltam vazios
+# ou com erro em execuções seguidas são tentados com backoff exponencial e, após
+# FALHAS_LIMIAR falhas, entram em quarentena (nova tentativa só a cada
+# FALHAS_QUARENTENA_DIAS, para pegar um ticker que voltou a negociar).
+# Throttle, timeout e erro de transporte não contam: o upstream não respondeu
+# sobre o ticker, que só é tentado de novo na próxima execução (checkpoint).
+#
+# Uso direto:  python -m modules.failures                      (relatório)
+#              python -m modules.failures --liberar fiis XPTO11  (tira da quarentena)
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from modules.bulk import BulkWriter
+from modules.metrics import registry
+from modules.ratelimit import is_transient
+
+# -------------------------
+# Configuração
+# -------------------------
+TABLE = "coleta_falhas"
+ENABLED = os.getenv("FALHAS_REGISTRO", "1") != "0"
+THRESHOLD = int(os.getenv("FALHAS_LIMIAR", "5"))                      # falhas seguidas até a quarentena
+BACKOFF_BASE_HOURS = float(os.getenv("FALHAS_BACKOFF_HORAS", "12"))   # 12h, 24h, 48h, 96h...
+QUARANTINE_DAYS = float(os.getenv("FALHAS_QUARENTENA_DIAS", "30"))
+COLUMNS = [
+    "processor", "ticker", "falhas", "motivo", "primeira_falha",
+    "ultima_falha", "proxima_tentativa", "quarentena",
+]
+
+
+def next_attempt(agora, falhas):
+    if falhas >= THRESHOLD:
+        return agora + timedelta(days=QUARANTINE_DAYS)
+    horas = BACKOFF_BASE_HOURS * 2 ** (falhas - 1)
+    return agora + timedelta(hours=min(horas, QUARANTINE_DAYS * 24))
+
+
+class FailureRegistry:
+    def __init__(self, engine, processor, enabled=ENABLED):
+        self.engine = engine
+        self.processor = processor
+        self.enabled = enabled
+        self.agora = datetime.now(timezone.utc)
+        self.known = {}       # ticker -> linha atual do registro
+        self.failed = {}      # ticker -> motivo (nesta execução)
+        self.recovered = set()
+        self.skipped = []
+
+    # -------------------------
+    # Leitura (uma consulta por processor)
+    # -------------------------
+    def load(self):
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT ticker, falhas, primeira_falha, proxima_tentativa, quarentena "
+                     f"FROM {TABLE} WHERE processor = :processor"),
+                {"processor": self.processor},
+            ).mappings()
+            self.known = {r["ticker"]: dict(r) for r in rows}
+
+    def due(self, row):
+        proxima = row["proxima_tentativa"]
+        if isinstance(proxima, str):  # SQLite (bench) devolve texto
+            proxima = datetime.fromisoformat(proxima)
+        if proxima.tzinfo is None:
+            proxima = proxima.replace(tzinfo=timezone.utc)
+        return proxima <= self.agora
+
+    def filter(self, tickers):
+        if not self.enabled:
+            return tickers
+        self.load()
+        restantes = []
+        for t in tickers:
+            row = self.known.get(t)
+            if row is None or self.due(row):
+                restantes.append(t)
+            else:
+                self.skipped.append(t)
+        if self.skipped:
+            em_quarentena = sum(1 for t in self.skipped if self.known[t]["quarentena"])
+            print(
+                f"⏸️ Falhas {self.processor}: {len(self.skipped)} ticker(s) em backoff "
+                f"({em_quarentena} em quarentena) ficam fora desta execução."
+            )
+        return restantes
+
+    # -------------------------
+    # Registro
+    # -------------------------
+    def record(self, ticker, status="ok", motivo=None):
+        if not self.enabled:
+            return
+        if status == "ok":
+            if ticker in self.known:
+                self.recovered.add(ticker)
+        elif motivo is not None and is_transient(motivo):
+            return
+        else:
+            self.failed[ticker] = motivo or status
+
+    def flush(self):
+        if not self.enabled or not (self.failed or self.recovered):
+            return
+        linhas = []
+        for ticker, motivo in self.failed.items():
+            anterior = self.known.get(ticker) or {}
+            falhas = (anterior.get("falhas") or 0) + 1
+            linhas.append({
+                "processor": self.processor,
+                "ticker": ticker,
+                "falhas": falhas,
+                "motivo": str(motivo)[:200],
+                "primeira_falha": anterior.get("primeira_falha") or self.agora,
+                "ultima_falha": self.agora,
+                "proxima_tentativa": next_attempt(self.agora, falhas),
+                "quarentena": falhas >= THRESHOLD,
+            })
+            self.known[ticker] = linhas[-1]
+
+        writer = BulkWriter(
+            self.engine, TABLE, COLUMNS, conflict=("processor", "ticker"),
+            update=[c for c in COLUMNS if c not in ("processor", "ticker", "primeira_falha")],
+        )
+        writer.extend(linhas)
+        writer.flush()
+
+        if self.recovered:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(f"DELETE FROM {TABLE} WHERE processor = :processor AND ticker = :ticker"),
+                    [{"processor": self.processor, "ticker": t} for t in self.recovered],
+                )
+            for t in self.recovered:
+                self.known.pop(t, None)
+
+        self.failed, self.recovered = {}, set()
+
+    # -------------------------
+    # Relatório
+    # -------------------------
+    def report(self):
+        if not self.enabled:
+            return
+        self.flush()
+        quarentena = sorted(t for t, r in self.known.items() if r["quarentena"])
+        backoff = len(self.known) - len(quarentena)
+        registry.set_gauge("collector_tickers_quarantined", len(quarentena), processor=self.processor)
+        registry.set_gauge("collector_tickers_backoff", backoff, processor=self.processor)
+        if not self.known:
+            return
+        amostra = ", ".join(quarentena[:20]) + (" ..." if len(quarentena) > 20 else "")
+        print(
+            f"🚫 Falhas {self.processor}: {backoff} em backoff, {len(quarentena)} em quarentena"
+            + (f" ({amostra})" if quarentena else "")
+        )
+
+
+# -------------------------
+# CLI
+# -------------------------
+def print_report(engine):
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"""
+            SELECT processor, ticker, falhas, motivo, primeira_falha, proxima_tentativa, quarentena
+            FROM {TABLE} ORDER BY processor, quarentena DESC, falhas DESC, ticker
+        """)).fetchall()
+    if not rows:
+        print("✅ Nenhum ticker com falhas registradas.")
+        return
+    print(f"{'processor':<10} {'ticker':<14} {'falhas':>6}  {'estado':<11} {'desde':<10}  próxima tentativa  motivo")
+    for p, t, n, motivo, primeira, proxima, q in rows:
+        estado = "quarentena" if q else "backoff"
+        print(f"{p:<10} {t:<14} {n:>6}  {estado:<11} {str(primeira)[:10]:<10}  {str(proxima)[:16]:<17}  {motivo}")
+
+
+def release(engine, processor, ticker):
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {TABLE} WHERE processor = :processor AND ticker = :ticker"),
+            {"processor": processor, "ticker": ticker},
+        )
+    print(f"🔓 {processor}/{ticker} liberado; volta a ser coletado na próxima execução.")
+
+
+if __name__ == "__main__":
+    import sys
+    from modules.db import build_engine
+
+    engine = build_engine()
+    if "--liberar" in sys.argv:
+        i = sys.argv.index("--liberar")
+        release(engine, sys.argv[i + 1], sys.argv[i + 2])
+    else:
+        print_report(engine)
+    engine.dispose()
@@ -1,120 +1,81 @@
 # modules/fiis.py
-import os
-import yfinance as yf
-from sqlalchemy import create_engine, text
-from datetime import datetime
-from dotenv import load_dotenv
+from modules import yahoo
+from modules.bulk import BulkWriter
+from modules.cache import get_cache
+from modules.executor import FetchExecutor
+from modules.latest import LatestQuotes
+from modules.normalize import normalize
+from modules.pipeline import BatchCollector, load_tickers
+from modules.sources import SourceFallback
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
 TICKERS_TABLE = "tickers_fiis"
 
+# coluna -> (tipo, chaves de origem em ordem de preferência); ver modules/normalize.py
+# "download" é a cotação em lote do yf.download, usada quando o .info é pulado
+# (cache em dia) ou não traz preço
+SCHEMA = {
+    "valor": ("float", ["yahoo.regularMarketPrice", "download.Close"]),
+    "dividend_yield": ("float", ["yahoo.dividendYield"]),
+    "ultimo_rendimento": ("float", ["yahoo.lastDividendValue"]),
+    "p_vp": ("float", ["yahoo.priceToBook"]),
+    "p_l": ("float", ["yahoo.trailingPE"]),
+    "beta": ("float", ["yahoo.beta", "cache.beta"]),
+    "patrimonio": ("float", ["yahoo.totalAssets", "cache.patrimonio"]),
+    "liquidez_diaria": ("float", ["yahoo.averageDailyVolume10Day"]),
+    "valor_em_caixa": ("float", ["yahoo.cash", "cache.valor_em_caixa"]),
+    "setor": ("text", ["yahoo.sector", "cache.setor"]),
+    "rentabilidade_12m": ("float", ["yahoo.52WeekChange"]),
+}
+FIELDS = list(SCHEMA)
+COLUMNS = ["data_registro", "ticker", *FIELDS]
+REQUIRED = ["valor"]
+# Campos que mudam devagar: guardados no cache e usados quando o Yahoo os omite;
+# com os dois grupos em dia o .info do FII não é chamado (modules/cache.py)
+CACHED_GROUPS = {
+    "perfil": ["setor"],
+    "fundamentos": ["patrimonio", "valor_em_caixa", "beta"],
+}
+
 class FIIProcessor:
-    def __init__(self, engine):
+    def __init__(self, engine, executor=None, cache=None):
         self.engine = engine
+        self.executor = executor or FetchExecutor()
+        self.cache = cache or get_cache()
 
     def get_fii_data(self, ticker):
-        ticker_yf = ticker if ticker.upper().endswith(".SA") else ticker + ".SA"
-        try:
-            t = yf.Ticker(ticker_yf)
-            info = t.info
-            return {
-                "valor": info.get("regularMarketPrice"),
-                "dividend_yield": info.get("dividendYield"),
-                "ultimo_rendimento": info.get("lastDividendValue"),
-                "p_vp": info.get("priceToBook"),
-                "p_l": info.get("trailingPE"),
-                "beta": info.get("beta"),
-                "patrimonio": info.get("totalAssets"),
-                "liquidez_diaria": info.get("averageDailyVolume10Day"),
-                "valor_em_caixa": info.get("cash"),
-                "setor": info.get("sector"),
-                "rentabilidade_12m": info.get("52WeekChange"),
-            }
-        except Exception as e:
-            print(f"❌ Erro ao buscar FII {ticker}: {e}")
-            return None
-
-    def run(self):
-     with self.engine.begin() as conn:
-        # Criar tabela se não existir
-        conn.exec_driver_sql("""
-            CREATE TABLE IF NOT EXISTS historico_fiis (
-                id SERIAL PRIMARY KEY,
-                data_registro DATE,
-                ticker TEXT,
-                valor NUMERIC,
-                dividend_yield NUMERIC,
-                ultimo_rendimento NUMERIC,
-                p_vp NUMERIC,
-                p_l NUMERIC,
-                beta NUMERIC,
-                patrimonio NUMERIC,
-                liquidez_diaria NUMERIC,
-                valor_em_caixa NUMERIC,
-                setor TEXT,
-                rentabilidade_12m NUMERIC,
-                UNIQUE(ticker, data_registro)
-            )
-        """)
-
-        # Buscar tickers
-        result = conn.execute(text(f"SELECT ticker FROM {TICKERS_TABLE}")).fetchall()
-        tickers = [r[0].strip() for r in result if r[0]]  # Remove espaços e ignora nulos
-        print(f"TICKERS encontrados: {tickers}")
+        # Payload bruto; a conversão de tipos é feita em lote em frame
+        cache = self.cache.fresh("yahoo", ticker, CACHED_GROUPS)
+        if cache is not None:
+            return {"cache": cache}
+        info = yahoo.info(yahoo.sa(ticker))
 
-        if not tickers:
-            print("⚠️ Nenhum ticker encontrado na tabela, verifique TICKERS_FIIS.")
-            return
+        return {"yahoo": info, "cache": self.cache.refresh(SCHEMA, "yahoo", ticker, info, CACHED_GROUPS)}
 
-        for i, ticker in enumerate(tickers, start=1):
-            print(f"[{i}/{len(tickers)}] Buscando {ticker}...")
-            data = self.get_fii_data(ticker)
+    def writer(self, **kwargs):
+        # Upsert por (ticker, data_registro); schema em modules/migrations.py
+        return BulkWriter(
+            self.engine, "historico_fiis", COLUMNS,
+            conflict=("ticker", "data_registro"), projections=[LatestQuotes("fiis")], **kwargs,
+        )
 
-            if data is None:
-                print(f"⚠️ Nenhum dado retornado para {ticker}, pulando...")
-                continue
+    def frame(self, lote, dia):
+        return normalize(
+            SCHEMA, [p for _, p in lote], ticker=[t.upper() for t, _ in lote], data_registro=dia,
+        )
 
-            print(f"DEBUG dados de {ticker}: {data}")
+    def fallback(self):
+        return SourceFallback("FIIs", SCHEMA, REQUIRED, {"download": yahoo.quote_many})
 
-            # Lista de campos esperados
-            fields = [
-                "valor", "dividend_yield", "ultimo_rendimento",
-                "p_vp", "p_l", "beta", "patrimonio", "liquidez_diaria",
-                "valor_em_caixa", "setor", "rentabilidade_12m"
-            ]
+    def collector(self, fallback=None):
+        # Sem "valor": .info sem cotação, ticker deslistado ou inexistente no Yahoo
+        return BatchCollector(
+            self.engine, "fiis", self.get_fii_data, self.frame, self.writer, "valor",
+            rotulo="FIIs", executor=self.executor, fallback=fallback,
+        )
 
-            safe_data = {field: data.get(field) for field in fields}
+    def replay(self, lotes):
+        self.collector().replay(lotes)
 
-            params = {"data_registro": datetime.today().date(), "ticker": ticker.upper(), **safe_data}
-            print(f"DEBUG params SQL: {params}")
-
-            insert_sql = text("""
-                INSERT INTO historico_fiis (
-                    data_registro, ticker, valor, dividend_yield, ultimo_rendimento,
-                    p_vp, p_l, beta, patrimonio, liquidez_diaria, valor_em_caixa, setor, rentabilidade_12m
-                )
-                VALUES (
-                    :data_registro, :ticker, :valor, :dividend_yield, :ultimo_rendimento,
-                    :p_vp, :p_l, :beta, :patrimonio, :liquidez_diaria, :valor_em_caixa, :setor, :rentabilidade_12m
-                )
-                ON CONFLICT (ticker, data_registro) DO UPDATE SET
-                    valor = EXCLUDED.valor,
-                    dividend_yield = EXCLUDED.dividend_yield,
-                    ultimo_rendimento = EXCLUDED.ultimo_rendimento,
-                    p_vp = EXCLUDED.p_vp,
-                    p_l = EXCLUDED.p_l,
-                    beta = EXCLUDED.beta,
-                    patrimonio = EXCLUDED.patrimonio,
-                    liquidez_diaria = EXCLUDED.liquidez_diaria,
-                    valor_em_caixa = EXCLUDED.valor_em_caixa,
-                    setor = EXCLUDED.setor,
-                    rentabilidade_12m = EXCLUDED.rentabilidade_12m
-            """)
-
-            try:
-                conn.execute(insert_sql, params)
-                print(f"✅ {ticker} inserido/atualizado com sucesso.")
-            except Exception as e:
-                print(f"❌ Erro ao inserir {ticker}: {e}")
+    def run(self):
+        self.collector(self.fallback()).run(load_tickers(self.engine, TICKERS_TABLE))
+        self.cache.report("FIIs")
@@ -0,0 +1,57 @@
+# modules/http_client.py
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# -------------------------
+# Configuração
+# -------------------------
+RETRIES = int(os.getenv("HTTP_RETRIES", "4"))
+BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))  # 0.5s, 1s, 2s, 4s...
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+RETRY_STATUS = (500, 502, 504)
+
+
+# -------------------------
+# Sessão com keep-alive + retry/backoff
+# -------------------------
+# Aqui só falha de conexão e 5xx de servidor. Throttle (429/503) volta na hora
+# para o raise_for_status(): quem repete é o chamador, por dentro de
+# ratelimit.limited(), para cada tentativa passar pelo limitador AIMD
+# (ratelimit.retry_throttled). Depois da última tentativa a resposta é
+# devolvida normalmente.
+def build_session(retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE, headers=None):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=False,  # Retry-After fica com ratelimit.retry_throttled
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+# -------------------------
+# Uma sessão compartilhada por host
+# -------------------------
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_session(host):
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = build_session()
+            _sessions[host] = session
+        return session
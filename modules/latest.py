@@ -0,0 +1,99 @@
+# modules/latest.py
+from modules.bulk import BulkWriter
+
+# -------------------------
+# Configuração
+# -------------------------
+TABLE = "latest_quotes"
+COLUMNS = [
+    "asset_class", "ticker", "data_ref", "preco", "variacao_dia", "volume",
+    "market_cap", "dividend_yield", "p_l", "p_vp",
+]
+# Métricas nulas no lote novo mantêm o último valor conhecido
+METRICS = ["variacao_dia", "volume", "market_cap", "dividend_yield", "p_l", "p_vp"]
+
+# classe -> coluna de latest_quotes <- coluna do histórico
+MAPPINGS = {
+    "acoes": {
+        "ticker": "ticker", "data_ref": "data", "preco": "preco_fechamento", "volume": "volume",
+        "dividend_yield": "dividend_yield", "p_l": "pl", "p_vp": "pvp",
+    },
+    "fiis": {
+        "ticker": "ticker", "data_ref": "data_registro", "preco": "valor",
+        "dividend_yield": "dividend_yield", "p_l": "p_l", "p_vp": "p_vp",
+    },
+    "bdr": {
+        "ticker": "ticker", "data_ref": "data_registro", "preco": "preco_atual",
+        "market_cap": "market_cap", "dividend_yield": "dividend_yield", "p_l": "p_l", "p_vp": "p_vp",
+    },
+    "etf": {
+        "ticker": "ticker", "data_ref": "data_registro", "preco": "preco_atual",
+        "variacao_dia": "variacao_dia", "volume": "volume", "market_cap": "market_cap",
+        "dividend_yield": "dividend_yield", "p_l": "p_l", "p_vp": "p_vp",
+    },
+    "cripto": {
+        "ticker": "simbolo", "data_ref": "tempo_utc", "preco": "preco_atual",
+        "variacao_dia": "price_change_percentage_24h", "volume": "total_volume",
+        "market_cap": "market_cap",
+    },
+}
+
+
+# -------------------------
+# Projeção histórico -> latest_quotes
+# -------------------------
+# Passada em `projections` do BulkWriter do histórico: a cada lote, a linha mais
+# recente de cada ticker vai para latest_quotes na mesma transação. Linhas mais
+# antigas que a gravada (backfill) não sobrescrevem.
+# Linhas no mesmo instante: sem `desempate` a última gravada vence; com
+# `desempate` (coluna de latest_quotes) vence o maior valor, no lote e no banco.
+# Na CoinGecko símbolos se repetem e as páginas chegam fora de ordem (fetch
+# concorrente), então a cripto desempata pelo market cap.
+class LatestQuotes:
+    def __init__(self, asset_class, desempate=None):
+        self.asset_class = asset_class
+        self.mapping = MAPPINGS[asset_class]
+        self.desempate = desempate
+        if desempate:
+            where = (
+                f"{TABLE}.data_ref < EXCLUDED.data_ref OR ({TABLE}.data_ref = EXCLUDED.data_ref "
+                f"AND COALESCE(EXCLUDED.{desempate}, -1) >= COALESCE({TABLE}.{desempate}, -1))"
+            )
+        else:
+            where = f"{TABLE}.data_ref <= EXCLUDED.data_ref"
+        self.writer = BulkWriter(
+            None, TABLE, COLUMNS, conflict=("asset_class", "ticker"), coalesce=METRICS,
+            conflict_where=where,
+        )
+
+    def _ganha(self, r, atual, idx):
+        data_ref = idx["data_ref"]
+        if atual is None or r[data_ref] > atual[data_ref]:
+            return True
+        if r[data_ref] < atual[data_ref]:
+            return False
+        if not self.desempate:
+            return True
+        i = idx[self.desempate]
+        return (r[i] if r[i] is not None else -1) >= (atual[i] if atual[i] is not None else -1)
+
+    def project(self, columns, rows):
+        idx = {c: columns.index(h) for c, h in self.mapping.items()}
+        ticker, data_ref, preco = idx["ticker"], idx["data_ref"], idx["preco"]
+
+        mais_recente = {}
+        for r in rows:
+            if r[ticker] is None or r[data_ref] is None or r[preco] is None:
+                continue
+            if self._ganha(r, mais_recente.get(r[ticker]), idx):
+                mais_recente[r[ticker]] = r
+
+        return [
+            tuple(self.asset_class if c == "asset_class" else (r[idx[c]] if c in idx else None) for c in COLUMNS)
+            for r in mais_recente.values()
+        ]
+
+    def write(self, cur, columns, rows, sqlite=False):
+        projetadas = self.project(columns, rows)
+        if projetadas:
+            self.writer.write_rows(cur, projetadas, sqlite)
@@ -0,0 +1,207 @@
+# modules/metrics.py
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# -------------------------
+# Configuração
+# -------------------------
+METRICS_DIR = os.getenv("METRICS_DIR", "reports")
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # segundos
+
+# Processor corrente (definido pelo orquestrador/entrypoint e propagado para
+# as threads do FetchExecutor via contextvars)
+PROCESSOR = contextvars.ContextVar("processor", default="-")
+
+
+def set_processor(nome):
+    PROCESSOR.set(nome)
+
+
+def _escape(valor):
+    # Valor de label no formato texto do Prometheus: \\, \" e \n escapados
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# -------------------------
+# Série por (processor, upstream, operação)
+# -------------------------
+class Serie:
+    def __init__(self):
+        self.count = 0
+        self.latencias = []
+        self.erros = {}
+        self.bytes = 0
+        self.rows = 0
+
+    def quantil(self, q):
+        if not self.latencias:
+            return 0.0
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+    def buckets(self):
+        return [(le, sum(1 for x in self.latencias if x <= le)) for le in BUCKETS]
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": dict(self.erros),
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "latency": {
+                "sum": round(sum(self.latencias), 6),
+                "p50": round(self.quantil(0.50), 6),
+                "p95": round(self.quantil(0.95), 6),
+                "p99": round(self.quantil(0.99), 6),
+                "max": round(max(self.latencias, default=0.0), 6),
+                "buckets": {str(le): n for le, n in self.buckets()},
+            },
+        }
+
+
+class Observacao:
+    # Devolvida por measure(): o chamador pode anotar bytes/linhas e erros
+    # que ele mesmo trata (fetches que devolvem {} em vez de levantar)
+    def __init__(self):
+        self.bytes = 0
+        self.rows = 0
+        self.erro = None
+
+    def error(self, exc):
+        self.erro = exc
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.gauges = {}
+        self.inicio = datetime.now(timezone.utc)
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+            self.gauges = {}
+            self.inicio = datetime.now(timezone.utc)
+
+    def record(self, processor, upstream, op, segundos, obs):
+        with self.lock:
+            serie = self.series.setdefault((processor, upstream, op), Serie())
+            serie.count += 1
+            serie.latencias.append(segundos)
+            serie.bytes += obs.bytes
+            serie.rows += obs.rows
+            if obs.erro is not None:
+                nome = type(obs.erro).__name__
+                serie.erros[nome] = serie.erros.get(nome, 0) + 1
+
+    def set_gauge(self, nome, valor, **labels):
+        with self.lock:
+            self.gauges[(nome, tuple(sorted(labels.items())))] = valor
+
+    # -------------------------
+    # Saídas
+    # -------------------------
+    def report(self, job):
+        fim = datetime.now(timezone.utc)
+        with self.lock:
+            return {
+                "job": job,
+                "inicio": self.inicio.isoformat(),
+                "fim": fim.isoformat(),
+                "duracao": (fim - self.inicio).total_seconds(),
+                "series": [
+                    {"processor": p, "upstream": u, "op": o, **s.as_dict()}
+                    for (p, u, o), s in sorted(self.series.items())
+                ],
+                "gauges": [
+                    {"nome": n, "labels": dict(l), "valor": v}
+                    for (n, l), v in sorted(self.gauges.items())
+                ],
+            }
+
+    def prometheus(self, job):
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+        linhas = [
+            "# HELP collector_request_duration_seconds Latência por processor/upstream/operação.",
+            "# TYPE collector_request_duration_seconds histogram",
+        ]
+        with self.lock:
+            itens = sorted(self.series.items())
+            gauges = sorted(self.gauges.items())
+            for (p, u, o), s in itens:
+                base = {"job": job, "processor": p, "upstream": u, "op": o}
+                for le, n in s.buckets():
+                    linhas.append(f"collector_request_duration_seconds_bucket{fmt({**base, 'le': le})} {n}")
+                linhas.append(f"collector_request_duration_seconds_bucket{fmt({**base, 'le': '+Inf'})} {s.count}")
+                linhas.append(f"collector_request_duration_seconds_sum{fmt(base)} {sum(s.latencias):.6f}")
+                linhas.append(f"collector_request_duration_seconds_count{fmt(base)} {s.count}")
+
+            linhas += ["# TYPE collector_request_errors_total counter"]
+            for (p, u, o), s in itens:
+                for erro, n in sorted(s.erros.items()):
+                    labels = {"job": job, "processor": p, "upstream": u, "op": o, "error": erro}
+                    linhas.append(f"collector_request_errors_total{fmt(labels)} {n}")
+
+            linhas += ["# TYPE collector_bytes_total counter"]
+            for (p, u, o), s in itens:
+                if s.bytes:
+                    labels = {"job": job, "processor": p, "upstream": u, "op": o}
+                    linhas.append(f"collector_bytes_total{fmt(labels)} {s.bytes}")
+
+            linhas += ["# TYPE collector_rows_total counter"]
+            for (p, u, o), s in itens:
+                if s.rows:
+                    labels = {"job": job, "processor": p, "upstream": u, "op": o}
+                    linhas.append(f"collector_rows_total{fmt(labels)} {s.rows}")
+
+            # Um TYPE por métrica (o textfile collector rejeita repetido); gauges já ordenados por nome
+            anterior = None
+            for (nome, labels), valor in gauges:
+                if nome != anterior:
+                    linhas.append(f"# TYPE {nome} gauge")
+                    anterior = nome
+                linhas.append(f"{nome}{fmt({'job': job, **dict(labels)})} {valor}")
+
+        duracao = (datetime.now(timezone.utc) - self.inicio).total_seconds()
+        linhas += [
+            "# TYPE collector_run_duration_seconds gauge",
+            f"collector_run_duration_seconds{fmt({'job': job})} {duracao:.3f}",
+        ]
+        return "\n".join(linhas) + "\n"
+
+    def write(self, job, pasta=METRICS_DIR):
+        os.makedirs(pasta, exist_ok=True)
+        json_path = os.path.join(pasta, f"{job}_report.json")
+        prom_path = os.path.join(pasta, f"{job}.prom")
+        with open(json_path, "w") as f:
+            json.dump(self.report(job), f, indent=2, ensure_ascii=False)
+        with open(prom_path, "w") as f:
+            f.write(self.prometheus(job))
+        print(f"📈 Métricas gravadas em {json_path} e {prom_path}")
+
+
+registry = Registry()
+
+
+# -------------------------
+# Instrumentação
+# -------------------------
+@contextmanager
+def measure(upstream, op):
+    obs = Observacao()
+    start = time.perf_counter()
+    try:
+        yield obs
+    except Exception as e:
+        obs.error(e)
+        raise
+    finally:
+        registry.record(PROCESSOR.get(), upstream, op, time.perf_counter() - start, obs)
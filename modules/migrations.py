@@ -0,0 +1,357 @@
+# modules/migrations.py
+# Migrações versionadas: todo o DDL das tabelas historico_* mora aqui.
+# Cada execução faz uma única consulta em schema_migrations; as versões que
+# faltam são aplicadas juntas numa transação (DDL é transacional no Postgres).
+#
+# Uso direto (aplica e mostra a versão):  python -m modules.migrations
+from sqlalchemy import text
+
+TABLE = "schema_migrations"
+LOCK_ID = 7_201_015  # pg_advisory_xact_lock: diário e cripto podem subir juntos
+
+
+# -------------------------
+# Migrações (nunca editar uma versão já publicada; criar a próxima)
+# -------------------------
+MIGRATIONS = [
+    (1, "tabelas_historico", [
+        """
+        CREATE TABLE IF NOT EXISTS historico_fiis (
+            id SERIAL PRIMARY KEY,
+            data_registro DATE,
+            ticker TEXT,
+            valor NUMERIC,
+            dividend_yield NUMERIC,
+            ultimo_rendimento NUMERIC,
+            p_vp NUMERIC,
+            p_l NUMERIC,
+            beta NUMERIC,
+            patrimonio NUMERIC,
+            liquidez_diaria NUMERIC,
+            valor_em_caixa NUMERIC,
+            setor TEXT,
+            rentabilidade_12m NUMERIC,
+            UNIQUE(ticker, data_registro)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS historico_acoes (
+            id SERIAL PRIMARY KEY,
+            ticker TEXT NOT NULL,
+            data DATE NOT NULL,
+            preco_abertura NUMERIC,
+            preco_fechamento NUMERIC,
+            preco_maximo NUMERIC,
+            preco_minimo NUMERIC,
+            volume NUMERIC,
+            pl NUMERIC,
+            pvp NUMERIC,
+            beta NUMERIC,
+            dividend_yield NUMERIC,
+            last_dividend NUMERIC,
+            dividend_date DATE,
+            UNIQUE(ticker, data)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS historico_bdr (
+            id SERIAL PRIMARY KEY,
+            ticker TEXT NOT NULL,
+            data_registro DATE,
+            preco_atual NUMERIC,
+            preco_52_semana_alta NUMERIC,
+            preco_52_semana_baixa NUMERIC,
+            preco_media_50d NUMERIC,
+            preco_media_200d NUMERIC,
+            p_l NUMERIC,
+            p_vp NUMERIC,
+            p_s NUMERIC,
+            market_cap NUMERIC,
+            enterprise_value NUMERIC,
+            roe NUMERIC,
+            roa NUMERIC,
+            margem_lucro NUMERIC,
+            margem_operacional NUMERIC,
+            dividend_yield NUMERIC,
+            payout_ratio NUMERIC,
+            crescimento_receita NUMERIC,
+            crescimento_lucro NUMERIC,
+            beta NUMERIC,
+            setor TEXT,
+            industria TEXT,
+            nome_empresa TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS historico_etf (
+            id SERIAL PRIMARY KEY,
+            ticker TEXT,
+            preco_atual NUMERIC,
+            variacao_dia NUMERIC,
+            variacao_1m NUMERIC,
+            variacao_6m NUMERIC,
+            variacao_12m NUMERIC,
+            fifty_two_week_low NUMERIC,
+            fifty_two_week_high NUMERIC,
+            p_l NUMERIC,
+            p_vp NUMERIC,
+            dividend_yield NUMERIC,
+            beta NUMERIC,
+            volume NUMERIC,
+            market_cap NUMERIC,
+            setor TEXT,
+            pais TEXT,
+            data_registro DATE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS historico_cripto (
+            tempo_utc TIMESTAMPTZ NOT NULL,
+            simbolo TEXT,
+            nome TEXT,
+            preco_atual NUMERIC,
+            market_cap NUMERIC,
+            market_cap_rank INTEGER,
+            fully_diluted_valuation NUMERIC,
+            total_volume NUMERIC,
+            high_24h NUMERIC,
+            low_24h NUMERIC,
+            price_change_24h NUMERIC,
+            price_change_percentage_24h NUMERIC,
+            market_cap_change_24h NUMERIC,
+            market_cap_change_percentage_24h NUMERIC,
+            circulating_supply NUMERIC,
+            total_supply NUMERIC,
+            max_supply NUMERIC,
+            ath NUMERIC,
+            ath_change_percentage NUMERIC,
+            ath_date TIMESTAMPTZ,
+            atl NUMERIC,
+            atl_change_percentage NUMERIC,
+            atl_date TIMESTAMPTZ,
+            last_updated TIMESTAMPTZ,
+            price_change_percentage_1y_in_currency NUMERIC,
+            price_change_percentage_30d_in_currency NUMERIC,
+            price_change_percentage_7d_in_currency NUMERIC
+        )
+        """,
+    ]),
+    # BDR/ETF eram só INSERT: cada reexecução no mesmo dia duplicava linhas.
+    # Deduplica uma vez (fica a linha mais recente) e cria a chave do upsert.
+    (2, "unicidade_bdr_etf", [
+        """
+        DELETE FROM historico_bdr WHERE id NOT IN (
+            SELECT MAX(id) FROM historico_bdr GROUP BY ticker, data_registro
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS historico_bdr_ticker_data_key ON historico_bdr (ticker, data_registro)",
+        """
+        DELETE FROM historico_etf WHERE id NOT IN (
+            SELECT MAX(id) FROM historico_etf GROUP BY ticker, data_registro
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS historico_etf_ticker_data_key ON historico_etf (ticker, data_registro)",
+    ]),
+    # "Histórico do BTC" vira busca por índice em vez de varredura completa
+    (3, "indice_cripto_simbolo_tempo", [
+        "CREATE INDEX IF NOT EXISTS historico_cripto_simbolo_tempo_idx ON historico_cripto (simbolo, tempo_utc)",
+    ]),
+    (4, "coleta_checkpoint", [
+        """
+        CREATE TABLE IF NOT EXISTS coleta_checkpoint (
+            processor TEXT NOT NULL,
+            data_execucao DATE NOT NULL,
+            ticker TEXT NOT NULL,
+            status TEXT NOT NULL,
+            atualizado_em TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (processor, data_execucao, ticker)
+        )
+        """,
+    ]),
+    # Último valor por (classe, ticker), mantido pelos writers (modules/latest.py).
+    # Carga inicial a partir do histórico; na cripto, só o snapshot mais recente.
+    (5, "latest_quotes", [
+        """
+        CREATE TABLE IF NOT EXISTS latest_quotes (
+            asset_class TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            data_ref TIMESTAMPTZ NOT NULL,
+            preco NUMERIC,
+            variacao_dia NUMERIC,
+            volume NUMERIC,
+            market_cap NUMERIC,
+            dividend_yield NUMERIC,
+            p_l NUMERIC,
+            p_vp NUMERIC,
+            PRIMARY KEY (asset_class, ticker)
+        )
+        """,
+        """
+        INSERT INTO latest_quotes (asset_class, ticker, data_ref, preco, volume, dividend_yield, p_l, p_vp)
+        SELECT 'acoes', ticker, data, preco_fechamento, volume, dividend_yield, pl, pvp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY data DESC) AS rn
+            FROM historico_acoes
+        ) t WHERE rn = 1
+        ON CONFLICT (asset_class, ticker) DO NOTHING
+        """,
+        """
+        INSERT INTO latest_quotes (asset_class, ticker, data_ref, preco, dividend_yield, p_l, p_vp)
+        SELECT 'fiis', ticker, data_registro, valor, dividend_yield, p_l, p_vp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY data_registro DESC) AS rn
+            FROM historico_fiis WHERE ticker IS NOT NULL AND data_registro IS NOT NULL
+        ) t WHERE rn = 1
+        ON CONFLICT (asset_class, ticker) DO NOTHING
+        """,
+        """
+        INSERT INTO latest_quotes (asset_class, ticker, data_ref, preco, market_cap, dividend_yield, p_l, p_vp)
+        SELECT 'bdr', ticker, data_registro, preco_atual, market_cap, dividend_yield, p_l, p_vp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY data_registro DESC) AS rn
+            FROM historico_bdr WHERE data_registro IS NOT NULL
+        ) t WHERE rn = 1
+        ON CONFLICT (asset_class, ticker) DO NOTHING
+        """,
+        """
+        INSERT INTO latest_quotes (
+            asset_class, ticker, data_ref, preco, variacao_dia, volume, market_cap, dividend_yield, p_l, p_vp
+        )
+        SELECT 'etf', ticker, data_registro, preco_atual, variacao_dia, volume, market_cap,
+               dividend_yield, p_l, p_vp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY data_registro DESC) AS rn
+            FROM historico_etf WHERE ticker IS NOT NULL AND data_registro IS NOT NULL
+        ) t WHERE rn = 1
+        ON CONFLICT (asset_class, ticker) DO NOTHING
+        """,
+        """
+        INSERT INTO latest_quotes (asset_class, ticker, data_ref, preco, variacao_dia, volume, market_cap)
+        SELECT 'cripto', simbolo, tempo_utc, preco_atual, price_change_percentage_24h, total_volume, market_cap
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY simbolo ORDER BY market_cap DESC NULLS LAST) AS rn
+            FROM historico_cripto
+            WHERE simbolo IS NOT NULL AND tempo_utc = (SELECT MAX(tempo_utc) FROM historico_cripto)
+        ) t WHERE rn = 1
+        ON CONFLICT (asset_class, ticker) DO NOTHING
+        """,
+    ]),
+    # Falhas consecutivas por (processor, ticker): backoff e quarentena (modules/failures.py)
+    (6, "coleta_falhas", [
+        """
+        CREATE TABLE IF NOT EXISTS coleta_falhas (
+            processor TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            falhas INTEGER NOT NULL,
+            motivo TEXT,
+            primeira_falha TIMESTAMPTZ NOT NULL,
+            ultima_falha TIMESTAMPTZ NOT NULL,
+            proxima_tentativa TIMESTAMPTZ NOT NULL,
+            quarentena BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (processor, ticker)
+        )
+        """,
+    ]),
+    # Rollups OHLC da cripto por hora/dia e marca d'água de cada nível (modules/cripto_storage.py)
+    (7, "rollups_cripto", [
+        """
+        CREATE TABLE IF NOT EXISTS cripto_ohlc_hora (
+            simbolo TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            abertura NUMERIC,
+            maxima NUMERIC,
+            minima NUMERIC,
+            fechamento NUMERIC,
+            volume_24h NUMERIC,
+            market_cap NUMERIC,
+            amostras INTEGER,
+            PRIMARY KEY (simbolo, bucket)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cripto_ohlc_dia (
+            simbolo TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            abertura NUMERIC,
+            maxima NUMERIC,
+            minima NUMERIC,
+            fechamento NUMERIC,
+            volume_24h NUMERIC,
+            market_cap NUMERIC,
+            amostras INTEGER,
+            PRIMARY KEY (simbolo, bucket)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cripto_rollup_estado (
+            nivel TEXT PRIMARY KEY,
+            ate TIMESTAMPTZ NOT NULL
+        )
+        """,
+    ]),
+    # Dias já exportados para Parquet que foram regravados no banco (replay,
+    # métricas derivadas) e precisam ser reexportados (modules/export.py)
+    (8, "export_pendente", [
+        """
+        CREATE TABLE IF NOT EXISTS export_pendente (
+            classe TEXT NOT NULL,
+            dia DATE NOT NULL,
+            marcado_em TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (classe, dia)
+        )
+        """,
+    ]),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+# -------------------------
+# Execução
+# -------------------------
+def ensure_table(conn):
+    conn.exec_driver_sql(f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        versao INTEGER PRIMARY KEY,
+        nome TEXT NOT NULL,
+        aplicado_em TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def current_version(engine):
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text(f"SELECT COALESCE(MAX(versao), 0) FROM {TABLE}")).scalar()
+        except Exception:
+            return 0  # banco ainda sem schema_migrations
+
+
+def migrate(engine):
+    # Caminho comum (banco em dia): uma consulta e nenhum DDL
+    versao = current_version(engine)
+    if versao >= LATEST:
+        return versao
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+        ensure_table(conn)
+        # Relê sob o lock: outro job pode ter migrado enquanto esperávamos
+        versao = conn.execute(text(f"SELECT COALESCE(MAX(versao), 0) FROM {TABLE}")).scalar()
+
+        for numero, nome, comandos in MIGRATIONS:
+            if numero <= versao:
+                continue
+            for sql in comandos:
+                conn.exec_driver_sql(sql)
+            conn.execute(
+                text(f"INSERT INTO {TABLE} (versao, nome) VALUES (:versao, :nome)"),
+                {"versao": numero, "nome": nome},
+            )
+            print(f"🗄️ Migração {numero:03d} aplicada: {nome}")
+            versao = numero
+    return versao
+
+
+if __name__ == "__main__":
+    from modules.db import build_engine
+
+    engine = build_engine()
+    print(f"✅ Schema na versão {migrate(engine)}.")
+    engine.dispose()
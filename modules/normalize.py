@@ -0,0 +1,111 @@
+# modules/normalize.py
+# Normalização em lote dos payloads coletados.
+#
+# Cada tabela declara um schema: coluna -> (tipo, chaves de origem em ordem de
+# preferência). Chaves "fonte.campo" leem de payload[fonte] (ex.: "yahoo.sector",
+# "brapi.regularMarketPrice", "cache.setor"); sem ponto, do próprio payload.
+# A primeira chave não nula (depois da conversão de tipo) vence.
+#
+# normalize(schema, payloads, **fixas) devolve um DataFrame tipado, uma linha por
+# payload, pronto para BulkWriter.add_frame.
+import math
+
+# -------------------------
+# Configuração
+# -------------------------
+# Tipos: float, int, text, date, timestamp (ISO 8601, UTC), epoch_date (segundos -> data)
+# Epoch fora desta faixa (segundos) é lixo do upstream, não data
+EPOCH_MIN = 0
+EPOCH_MAX = 7.3e9  # ~ano 2200
+EPOCH_MS = 1e11    # acima disso o valor veio em milissegundos
+
+
+def _split(chave):
+    fonte, _, campo = chave.rpartition(".")
+    return fonte or None, campo
+
+
+def source_fields(schema, fonte):
+    # coluna -> primeira chave da fonte (ex.: o que guardar no cache a partir do .info)
+    campos = {}
+    for coluna, (_, chaves) in schema.items():
+        for chave in chaves:
+            f, campo = _split(chave)
+            if f == fonte:
+                campos[coluna] = campo
+                break
+    return campos
+
+
+def extract(schema, fonte, payload, colunas):
+    campos = source_fields(schema, fonte)
+    return {c: _clean(payload.get(campos[c])) for c in colunas if c in campos}
+
+
+def _clean(valor):
+    if isinstance(valor, float) and (math.isnan(valor) or math.isinf(valor)):
+        return None
+    return valor
+
+
+# -------------------------
+# Conversões vetorizadas
+# -------------------------
+def _convert(s, tipo):
+    import numpy as np
+    import pandas as pd
+
+    if tipo == "text":
+        s = s.astype(object)
+        return s.where(s.isna(), s.astype(str))
+    if tipo == "timestamp":
+        return pd.to_datetime(s, utc=True, errors="coerce", format="ISO8601")
+    if tipo == "date":
+        return pd.to_datetime(s, errors="coerce", format="ISO8601").dt.date
+
+    n = pd.to_numeric(s, errors="coerce").astype("float64").replace([np.inf, -np.inf], np.nan)
+    if tipo == "float":
+        return n
+    if tipo == "int":
+        return n.round().astype("Int64")
+    # epoch_date: segundos (ou milissegundos) desde 1970 -> data
+    n = n.where(n < EPOCH_MS, n / 1000)
+    n = n.where((n > EPOCH_MIN) & (n < EPOCH_MAX))
+    return pd.to_datetime(n, unit="s", errors="coerce").dt.date
+
+
+def _sources(schema, payloads):
+    # Uma tabela por fonte com só as chaves usadas pelo schema
+    import pandas as pd
+
+    chaves = {}
+    for _, lista in schema.values():
+        for chave in lista:
+            fonte, campo = _split(chave)
+            chaves.setdefault(fonte, {})[campo] = None
+    tabelas = {}
+    for fonte, campos in chaves.items():
+        registros = payloads if fonte is None else [p.get(fonte) or {} for p in payloads]
+        tabelas[fonte] = pd.DataFrame.from_records(registros, columns=list(campos))
+    return tabelas
+
+
+def normalize(schema, payloads, **fixas):
+    import pandas as pd
+
+    tabelas = _sources(schema, payloads)
+    colunas = {}
+    for coluna, (tipo, chaves) in schema.items():
+        serie = None
+        for chave in chaves:
+            fonte, campo = _split(chave)
+            valores = _convert(tabelas[fonte][campo], tipo)
+            serie = valores if serie is None else serie.fillna(valores)
+        if serie is None:
+            serie = _convert(pd.Series([None] * len(payloads), dtype=object), tipo)
+        colunas[coluna] = serie
+
+    df = pd.DataFrame(colunas, index=pd.RangeIndex(len(payloads)))
+    for coluna, valor in fixas.items():
+        df[coluna] = valor
+    return df
@@ -0,0 +1,95 @@
+# modules/orchestrator.py
+import os
+import threading
+import time
+from modules.metrics import registry, set_processor
+
+# -------------------------
+# Configuração
+# -------------------------
+MAX_PARALLEL = int(os.getenv("ORQ_MAX_PARALLEL", "4"))  # processors ao mesmo tempo
+TIMEOUT = float(os.getenv("ORQ_TIMEOUT", "1800"))        # segundos por processor
+POLL = 0.5
+
+
+class Tarefa:
+    def __init__(self, nome, fn, timeout):
+        self.nome = nome
+        self.fn = fn
+        self.timeout = timeout
+        self.status = "pendente"
+        self.erro = None
+        self.inicio = None
+        self.fim = None
+        self.done = threading.Event()
+
+    @property
+    def duracao(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fim or time.perf_counter()) - self.inicio
+
+
+# -------------------------
+# Orquestrador
+# -------------------------
+# Roda cada classe de ativo em sua própria thread (daemon, para que um
+# processor travado não segure o fim do job), no máximo `max_parallel` por
+# vez. Falhas e timeouts ficam isolados na tarefa e aparecem no resumo final.
+class Orchestrator:
+    def __init__(self, max_parallel=MAX_PARALLEL, timeout=TIMEOUT):
+        self.semaforo = threading.BoundedSemaphore(max(1, max_parallel))
+        self.timeout = timeout
+        self.tarefas = []
+
+    def add(self, nome, fn, timeout=None):
+        self.tarefas.append(Tarefa(nome, fn, timeout or self.timeout))
+
+    def _worker(self, tarefa):
+        with self.semaforo:
+            if tarefa.status != "pendente":
+                return
+            tarefa.status = "rodando"
+            set_processor(tarefa.nome)
+            tarefa.inicio = time.perf_counter()
+            try:
+                tarefa.fn()
+                status, erro = "ok", None
+            except Exception as e:
+                print(f"❌ ERRO durante o processamento de {tarefa.nome}: {e}")
+                status, erro = "erro", e
+            tarefa.fim = time.perf_counter()
+            registry.set_gauge("collector_processor_duration_seconds", round(tarefa.duracao, 3), processor=tarefa.nome)
+            if tarefa.status == "rodando":
+                tarefa.status, tarefa.erro = status, erro
+            tarefa.done.set()
+
+    def run(self):
+        inicio = time.perf_counter()
+        for tarefa in self.tarefas:
+            threading.Thread(target=self._worker, args=(tarefa,), name=tarefa.nome, daemon=True).start()
+
+        while True:
+            pendentes = [t for t in self.tarefas if not t.done.is_set() and t.status != "timeout"]
+            if not pendentes:
+                break
+            for t in pendentes:
+                if t.status == "rodando" and t.duracao > t.timeout:
+                    t.status = "timeout"
+                    t.fim = time.perf_counter()
+                    print(f"⏰ {t.nome} excedeu {t.timeout:.0f}s, seguindo sem ele.")
+            pendentes[0].done.wait(POLL)
+
+        self.summary(time.perf_counter() - inicio)
+        return self.tarefas
+
+    def summary(self, total):
+        icones = {"ok": "✅", "erro": "❌", "timeout": "⏰"}
+        print("\n------ Resumo por classe de ativo ------")
+        for t in self.tarefas:
+            linha = f"{icones.get(t.status, '•')} {t.nome:<8} {t.status:<8} {t.duracao:7.1f}s"
+            if t.erro:
+                linha += f"  {t.erro}"
+            print(linha)
+        soma = sum(t.duracao for t in self.tarefas)
+        print(f"Tempo total: {total:.1f}s (soma sequencial seria {soma:.1f}s)")
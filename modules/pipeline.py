@@ -0,0 +1,214 @@
+# modules/pipeline.py
+# Estágios da coleta ligados por filas limitadas:
+#
+#   fetch (threads do FetchExecutor) -> normalização (thread do processor)
+#        -> gravação (thread do writer, BulkWriter)
+#
+# Enquanto um lote é gravado os fetches seguem, e vice-versa. Cada fila tem
+# tamanho fixo: se o banco atrasar, a normalização espera na fila de gravação e
+# o executor para de submeter fetches (backpressure até a rede). As transações
+# continuam sendo só as do BulkWriter, uma por lote gravado.
+import contextvars
+import os
+import queue
+import threading
+from datetime import date
+
+# -------------------------
+# Configuração
+# -------------------------
+WRITE_QUEUE = int(os.getenv("PIPELINE_FILA_ESCRITA", "2"))  # lotes normalizados esperando o writer
+_FIM = object()
+
+
+class Pipeline:
+    def __init__(self, writer, queue_size=WRITE_QUEUE):
+        self.writer = writer
+        self.fila = queue.Queue(maxsize=max(1, queue_size))
+        self.erro = None
+        self.thread = None
+
+    @property
+    def batch_size(self):
+        return self.writer.batch_size
+
+    # -------------------------
+    # Estágio de gravação
+    # -------------------------
+    def _write_loop(self):
+        while True:
+            item = self.fila.get()
+            if item is _FIM:
+                return
+            if self.erro is not None:
+                continue  # só drena a fila; o erro sobe no write()/close()
+            try:
+                self.writer.add_frame(item)
+            except Exception as e:
+                self.erro = e
+
+    def start(self):
+        # copy_context: o processor corrente (métricas) segue para a thread
+        ctx = contextvars.copy_context()
+        self.thread = threading.Thread(
+            target=ctx.run, args=(self._write_loop,), name=f"writer-{self.writer.table}", daemon=True,
+        )
+        self.thread.start()
+        return self
+
+    def write(self, df):
+        # Bloqueia com a fila cheia (writer atrasado)
+        if self.erro is not None:
+            raise self.erro
+        self.fila.put(df)
+
+    def close(self):
+        # Grava o que já foi enfileirado e o buffer do writer, inclusive quando
+        # a coleta parou com erro
+        if self.thread is None:
+            return
+        self.fila.put(_FIM)
+        self.thread.join()
+        self.thread = None
+        self.writer.close()
+        if self.erro is not None:
+            raise self.erro
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return False
+        try:
+            self.close()
+        except Exception as e:
+            print(f"❌ Erro ao gravar {self.writer.table}: {e}")
+        return False
+
+
+# -------------------------
+# Coleta por ticker
+# -------------------------
+def clean_tickers(tickers):
+    # Sem nulos, vazios nem espaços (uma linha ruim na tabela não derruba a coleta)
+    return [t.strip() for t in tickers if isinstance(t, str) and t.strip()]
+
+
+def load_tickers(engine, tabela):
+    # Tickers cadastrados, já limpos
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"SELECT ticker FROM {tabela}")).fetchall()
+    tickers = clean_tickers(r[0] for r in rows)
+    if not tickers:
+        print(f"⚠️ Nenhum ticker encontrado em {tabela}.")
+    return tickers
+
+
+# Esqueleto comum da coleta diária (FIIs, ações, BDR, ETF):
+#
+#   [prefetch em lote] -> fetch (threads do FetchExecutor) -> fallback + arquivo
+#        bruto + normalização (aqui) -> gravação (thread do writer)
+#
+# com checkpoint do dia e registro de falhas. O processor fornece só o fetch de
+# um ticker (payload bruto por fonte), a normalização de um lote em DataFrame
+# (`frame(lote, dia)`) e o writer; linhas sem `preco` > 0 não são gravadas e o
+# ticker conta como sem dados. `prefetch(tickers)` (opcional) roda uma vez com os
+# tickers que faltam (ex.: yf.download das ações) e devolve os que ficaram sem
+# resposta. replay() reaproveita normalização e gravação sobre o arquivo bruto
+# (modules/archive.py), sem rede nem checkpoint/falhas.
+class BatchCollector:
+    def __init__(self, engine, classe, fetch, frame, writer, preco, rotulo=None,
+                 executor=None, fallback=None, prefetch=None):
+        self.engine = engine
+        self.classe = classe
+        self.fetch = fetch
+        self.frame = frame
+        self.writer = writer
+        self.preco = preco
+        self.rotulo = rotulo or classe
+        self.executor = executor
+        self.fallback = fallback
+        self.prefetch = prefetch
+
+    def write_batch(self, lote, pipe, checkpoint=None, falhas=None, dia=None, indisponiveis=()):
+        tickers = [t for t, _ in lote]
+        df = self.frame(lote, dia or date.today())
+        coletado = (df[self.preco] > 0).tolist()
+
+        # Replay (checkpoint None) não mexe em checkpoint/falhas; "ok" só é
+        # gravado depois que o writer confirma a linha (modules/checkpoint.py).
+        # Sem cotação com fonte de fallback indisponível não é "sem dados":
+        # tentado de novo na próxima execução, sem contar como falha
+        if checkpoint:
+            for ticker, ok in zip(tickers, coletado):
+                if ok:
+                    checkpoint.mark(ticker)
+                    falhas.record(ticker)
+                elif ticker in indisponiveis:
+                    print(f"⚠️ Sem cotação para {ticker} (fonte indisponível), fica para a próxima execução.")
+                    checkpoint.mark(ticker, "erro")
+                else:
+                    print(f"⚠️ Sem cotação para {ticker}, pulando...")
+                    checkpoint.mark(ticker, "sem_dados")
+                    falhas.record(ticker, "sem_dados")
+
+        pipe.write(df[coletado])
+        print(f"✅ {self.rotulo}: {sum(coletado)}/{len(df)} coletados no lote.")
+
+    def replay(self, lotes):
+        with Pipeline(self.writer()) as pipe:
+            for dia, registros in lotes:
+                self.write_batch([(r["ticker"], r["payload"]) for r in registros], pipe, dia=dia)
+
+    def run(self, tickers):
+        from modules.archive import RawArchive
+        from modules.checkpoint import Checkpoint
+        from modules.failures import FailureRegistry
+
+        # Só o que ainda não foi gravado hoje
+        checkpoint = Checkpoint(self.engine, self.classe)
+        tickers = checkpoint.remaining(tickers)
+        if not tickers:
+            print(f"✔ {self.rotulo}: tudo já coletado hoje.")
+            return
+        # Tickers que vêm falhando seguidamente esperam o backoff
+        falhas = FailureRegistry(self.engine, self.classe)
+        tickers = falhas.filter(tickers)
+        # Checkpoints "ok" vão para o banco com as linhas confirmadas (after_flush)
+        writer = self.writer(after_flush=checkpoint.flush)
+        sem_resposta = self.prefetch(tickers) if self.prefetch else set()
+
+        with RawArchive(self.classe) as arquivo, Pipeline(writer) as pipe:
+            def gravar(lote):
+                # Fontes secundárias só para quem ficou sem campos obrigatórios;
+                # o arquivo bruto guarda o payload completo
+                indisponiveis = self.fallback.fill(lote) if self.fallback else set()
+                indisponiveis |= sem_resposta
+                for ticker, payload in lote:
+                    arquivo.add(payload, ticker=ticker)
+                self.write_batch(lote, pipe, checkpoint, falhas, indisponiveis=indisponiveis)
+
+            lote = []
+            for i, (ticker, payload, erro) in enumerate(self.executor.map(self.fetch, tickers), start=1):
+                print(f"[{i}/{len(tickers)}] Processando {ticker}...")
+                if erro or payload is None:
+                    # Throttle/timeout não entram no registro de falhas (modules/failures.py)
+                    print(f"❌ Erro {ticker}: {erro or 'nenhum dado retornado'}")
+                    checkpoint.mark(ticker, "erro")
+                    falhas.record(ticker, "erro", erro)
+                    continue
+                lote.append((ticker, payload))
+                if len(lote) >= pipe.batch_size:
+                    gravar(lote)
+                    lote = []
+            if lote:
+                gravar(lote)
+
+        checkpoint.flush()
+        falhas.report()
+        if self.fallback:
+            self.fallback.report()
@@ -0,0 +1,17 @@
+# modules/processors.py
+# classe de ativo -> (módulo, processor), importados só quando forem usados
+# (main.py, replay do arquivo bruto em modules/archive.py)
+import importlib
+
+PROCESSORS = {
+    "fiis": ("modules.fiis", "FIIProcessor"),
+    "acoes": ("modules.acoes", "AcoesProcessor"),
+    "bdr": ("modules.bdr", "BDRProcessor"),
+    "etf": ("modules.etf", "ETFProcessor"),
+    "cripto": ("modules.cripto", "CriptoSaver"),
+}
+
+
+def load_processor(classe):
+    modulo, nome = PROCESSORS[classe]
+    return getattr(importlib.import_module(modulo), nome)
@@ -0,0 +1,219 @@
+# modules/ratelimit.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from modules.metrics import measure, registry
+
+# -------------------------
+# Configuração
+# -------------------------
+# Teto fixo de requisições/segundo por upstream (cota documentada do plano);
+# 0 = sem teto fixo, só o controle adaptativo de concorrência abaixo
+RATES = {
+    "yahoo": float(os.getenv("RATE_YAHOO", "0")),
+    "brapi": float(os.getenv("RATE_BRAPI", "3")),
+    "coingecko": float(os.getenv("RATE_COINGECKO", "0.5")),
+}
+DEFAULT_RATE = 2.0
+BURST = float(os.getenv("RATE_BURST", "5"))  # requisições permitidas de uma vez
+
+# AIMD: +1 requisição simultânea por "janela" saudável, corte multiplicativo
+# em 429/timeout e corte leve quando a latência passa de N× a latência base
+AIMD_INITIAL = float(os.getenv("AIMD_INICIAL", "4"))
+AIMD_MIN = 1.0
+AIMD_MAX = float(os.getenv("AIMD_MAX", "32"))
+AIMD_BACKOFF = float(os.getenv("AIMD_RECUO", "0.5"))
+AIMD_SLOW_BACKOFF = 0.9
+LATENCY_FACTOR = float(os.getenv("AIMD_FATOR_LATENCIA", "3"))
+# Novas tentativas depois de um throttle (1s, 2s, 4s... ou o Retry-After)
+THROTTLE_RETRIES = int(os.getenv("RETRIES_THROTTLE", "3"))
+
+
+# -------------------------
+# Token bucket
+# -------------------------
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(BURST, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# -------------------------
+# Um bucket compartilhado por host
+# -------------------------
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_bucket(host):
+    with _lock:
+        if host not in _buckets:
+            rate = RATES.get(host, DEFAULT_RATE)
+            _buckets[host] = TokenBucket(rate) if rate > 0 else None
+        return _buckets[host]
+
+
+def acquire(host, tokens=1):
+    # Tempo parado no bucket também entra no relatório (op "rate_limit")
+    bucket = get_bucket(host)
+    if bucket is None:
+        return
+    with measure(host, "rate_limit"):
+        bucket.acquire(tokens)
+
+
+# -------------------------
+# Concorrência adaptativa (AIMD) por host
+# -------------------------
+def is_throttle(erro):
+    resposta = getattr(erro, "response", None)
+    if getattr(resposta, "status_code", None) in (429, 503):
+        return True
+    nome = type(erro).__name__
+    return "RateLimit" in nome or "Timeout" in nome or "429" in str(erro)
+
+
+# Falhas em que o upstream não chegou a responder sobre o ticker: throttle, 5xx,
+# timeout e erros de transporte (requests/urllib3/curl_cffi). `erro` pode ser a
+# exceção ou só a mensagem (yf.download guarda texto por símbolo).
+TRANSIENT_NAMES = ("RateLimit", "Timeout", "Connection", "Curl", "MaxRetry", "Protocol", "SSL")
+TRANSIENT_TEXT = ("too many requests", "rate limit", "timed out", "timeout", "connection", "429")
+
+
+def is_transient(erro):
+    if is_throttle(erro):
+        return True
+    status = getattr(getattr(erro, "response", None), "status_code", None)
+    if status is not None and status >= 500:
+        return True
+    if any(n in type(erro).__name__ for n in TRANSIENT_NAMES):
+        return True
+    texto = str(erro).lower()
+    return any(m in texto for m in TRANSIENT_TEXT)
+
+
+class AIMDLimiter:
+    def __init__(self, host, initial=AIMD_INITIAL, minimum=AIMD_MIN, maximum=AIMD_MAX):
+        self.host = host
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(maximum, initial))
+        self.peak = self.limit
+        self.in_flight = 0
+        self.baselines = {}       # op -> latência base (mínimo que deriva devagar para cima)
+        self.last_cut = 0.0
+        self.throttles = 0
+        self.cond = threading.Condition()
+
+    def enter(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def _cut(self, fator, latencia):
+        # Um corte por janela: respostas de requisições que saíram antes do último
+        # corte (a mesma rajada de 429) não cortam de novo
+        agora = time.monotonic()
+        if agora - latencia < self.last_cut:
+            return
+        self.last_cut = agora
+        self.limit = max(self.minimum, self.limit * fator)
+
+    def exit(self, latencia, erro=None, op=None):
+        with self.cond:
+            self.in_flight -= 1
+            if erro is not None:
+                # Erros comuns (404, payload inválido) não dizem nada sobre carga
+                if is_throttle(erro):
+                    self.throttles += 1
+                    self._cut(AIMD_BACKOFF, latencia)
+            else:
+                # Base por operação: um yf.download de 200 símbolos não é comparado
+                # com o .info de um ticker
+                base = self.baselines.get(op)
+                base = latencia if base is None else min(latencia, base * 1.002)
+                self.baselines[op] = base
+                if latencia > LATENCY_FACTOR * base:
+                    self._cut(AIMD_SLOW_BACKOFF, latencia)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                    self.peak = max(self.peak, self.limit)
+            self.export()
+            self.cond.notify_all()
+
+    def export(self):
+        registry.set_gauge("collector_concurrency_limit", round(self.limit, 2), upstream=self.host)
+        registry.set_gauge("collector_concurrency_limit_peak", round(self.peak, 2), upstream=self.host)
+        registry.set_gauge("collector_throttle_events", self.throttles, upstream=self.host)
+
+
+_limiters = {}
+
+
+def get_limiter(host):
+    with _lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = AIMDLimiter(host)
+            _limiters[host] = limiter
+        return limiter
+
+
+@contextmanager
+def limited(host, op):
+    # Toda chamada a upstream: teto de taxa + vaga no limite adaptativo + métricas
+    acquire(host)
+    limiter = get_limiter(host)
+    limiter.enter()
+    start = time.perf_counter()
+    erro = None
+    try:
+        with measure(host, op) as obs:
+            yield obs
+        erro = obs.erro
+    except Exception as e:
+        erro = e
+        raise
+    finally:
+        limiter.exit(time.perf_counter() - start, erro, op)
+
+
+def retry_after(erro):
+    resposta = getattr(erro, "response", None)
+    valor = getattr(resposta, "headers", {}).get("Retry-After") if resposta is not None else None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_throttled(fn, tentativas=THROTTLE_RETRIES):
+    # Única camada de nova tentativa para throttle: `fn` chama o upstream dentro
+    # de limited(), então cada 429 corta a concorrência antes da próxima
+    for tentativa in range(tentativas + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if tentativa >= tentativas or not is_throttle(e):
+                raise
+            time.sleep(retry_after(e) or 2 ** tentativa)
@@ -0,0 +1,90 @@
+# modules/scheduler.py
+# Agendador em processo para os modos daemon.
+#
+# Cada tarefa roda em intervalos fixos alinhados ao relógio (intervalo de 5 min
+# = :00, :05, :10...), sem deriva acumulada nem jitter de cron. Tudo numa
+# thread só: uma execução que estoura o intervalo pula os horários perdidos em
+# vez de enfileirar execuções atrasadas. SIGTERM/SIGINT pedem parada: a
+# execução corrente termina e o laço sai (docker stop, systemctl stop, Ctrl+C);
+# um segundo sinal interrompe na hora.
+import math
+import signal
+import threading
+import time
+from modules.metrics import registry
+
+
+class Job:
+    def __init__(self, nome, intervalo, fn):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.fn = fn
+        self.proxima = None
+        self.execucoes = 0
+        self.falhas = 0
+
+    def agendar(self, agora):
+        # Próximo múltiplo do intervalo (contado da época Unix) depois de `agora`
+        self.proxima = (math.floor(agora / self.intervalo) + 1) * self.intervalo
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
+        self.parar = threading.Event()
+
+    def add(self, nome, intervalo, fn, imediato=False):
+        job = Job(nome, intervalo, fn)
+        job.agendar(time.time())
+        if imediato:
+            job.proxima = time.time()
+        self.jobs.append(job)
+        return job
+
+    # -------------------------
+    # Parada
+    # -------------------------
+    def stop(self, *_):
+        if self.parar.is_set():
+            raise KeyboardInterrupt
+        print("🛑 Parada solicitada; terminando a execução atual...")
+        self.parar.set()
+
+    def install_signals(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+    # -------------------------
+    # Laço
+    # -------------------------
+    def run_job(self, job):
+        inicio = time.time()
+        registry.set_gauge("collector_schedule_lag_seconds", round(inicio - job.proxima, 3), tarefa=job.nome)
+        try:
+            job.fn()
+        except Exception as e:
+            job.falhas += 1
+            print(f"❌ Erro na tarefa {job.nome}: {e}")
+        job.execucoes += 1
+
+        fim = time.time()
+        anterior = job.proxima
+        job.agendar(fim)
+        perdidos = round((job.proxima - anterior) / job.intervalo) - 1
+        if perdidos > 0:
+            print(f"⚠️ {job.nome} levou {fim - inicio:.1f}s; {perdidos} horário(s) pulado(s).")
+
+    def run(self):
+        if not self.jobs:
+            return
+        for job in self.jobs:
+            print(f"⏲️ {job.nome}: a cada {job.intervalo:.0f}s.")
+        while not self.parar.is_set():
+            job = min(self.jobs, key=lambda j: j.proxima)
+            espera = job.proxima - time.time()
+            if espera > 0 and self.parar.wait(espera):
+                break
+            self.run_job(job)
+
+        resumo = ", ".join(f"{j.nome} {j.execucoes}x ({j.falhas} falha(s))" for j in self.jobs)
+        print(f"👋 Agendador encerrado: {resumo}.")
@@ -0,0 +1,90 @@
+# modules/sources.py
+# Fallback preguiçoso entre fontes, campo a campo.
+#
+# A prioridade de cada campo já está no schema (modules/normalize.py: chaves
+# "fonte.campo" em ordem de preferência). O fetch por ticker traz só a fonte
+# primária; depois de cada lote, os tickers com algum campo obrigatório ainda
+# sem valor são consultados nas fontes secundárias, em lote e na ordem
+# declaradas, até ficarem completos. Uma fonte já presente no payload (mesmo
+# vazia) não é consultada de novo para aquele ticker. Ticker que a fonte não
+# chegou a responder (throttle, timeout, host fora) fica sem ela no payload: fill
+# devolve esses tickers, que não contam como "sem dados" na coleta. Os demais do
+# mesmo lote ficam com o que a fonte respondeu.
+#
+# O uso de cada fonte (consultas e tickers que ela completou) é reportado no fim
+# da execução e vira gauge no registry de métricas.
+from modules.metrics import registry
+from modules.normalize import normalize
+
+
+class SourceFallback:
+    def __init__(self, classe, schema, required, fontes, elegivel=None):
+        # fontes: nome -> fetch_many(tickers) -> ({TICKER: payload da fonte},
+        # {TICKER sem resposta}), em ordem de uso
+        # elegivel: nome -> filtro(ticker) (ex.: brapi só para ETFs brasileiros)
+        self.classe = classe
+        self.schema = {c: schema[c] for c in required}
+        self.fontes = dict(fontes)
+        self.elegivel = elegivel or {}
+        self.tickers = 0
+        self.completos = 0  # sem precisar de fallback
+        self.consultas = dict.fromkeys(self.fontes, 0)
+        self.completou = dict.fromkeys(self.fontes, 0)
+
+    def missing(self, payloads):
+        # Mesma conversão de tipos da gravação: valor inválido conta como ausente
+        return normalize(self.schema, payloads).isna().any(axis=1).tolist()
+
+    def fill(self, lote):
+        # lote: [(ticker, payload)]; payloads completados no lugar. Devolve os
+        # tickers que ficaram pendentes de uma fonte indisponível
+        indisponiveis = set()
+        if not lote:
+            return indisponiveis
+        payloads = [p for _, p in lote]
+        faltando = self.missing(payloads)
+        self.tickers += len(lote)
+        self.completos += faltando.count(False)
+
+        for fonte, fetch_many in self.fontes.items():
+            filtro = self.elegivel.get(fonte)
+            pendentes = [
+                i for i, (ticker, payload) in enumerate(lote)
+                if faltando[i] and fonte not in payload and (filtro is None or filtro(ticker))
+            ]
+            if not pendentes:
+                continue
+            try:
+                resultados, sem_resposta = fetch_many([lote[i][0] for i in pendentes])
+            except Exception as e:
+                print(f"❌ Erro no fallback {fonte} ({len(pendentes)} tickers): {e}")
+                resultados, sem_resposta = {}, {lote[i][0].upper() for i in pendentes}
+            for i in pendentes:
+                ticker = lote[i][0].upper()
+                if ticker in sem_resposta:
+                    indisponiveis.add(lote[i][0])
+                else:
+                    payloads[i][fonte] = resultados.get(ticker) or {}
+
+            antes = faltando
+            faltando = self.missing(payloads)
+            self.consultas[fonte] += len(pendentes)
+            self.completou[fonte] += sum(a and not f for a, f in zip(antes, faltando))
+        return indisponiveis
+
+    def report(self):
+        if not self.tickers:
+            return
+        partes = [
+            f"{fonte} consultada para {self.consultas[fonte]} (completou {self.completou[fonte]})"
+            for fonte in self.fontes
+        ]
+        print(
+            f"🔀 Fontes {self.classe}: {self.completos}/{self.tickers} completos sem fallback"
+            + ("; " + ", ".join(partes) if partes else "") + "."
+        )
+        registry.set_gauge("collector_source_tickers", self.tickers, classe=self.classe, fonte="total")
+        registry.set_gauge("collector_source_tickers", self.completos, classe=self.classe, fonte="primaria")
+        for fonte in self.fontes:
+            registry.set_gauge("collector_source_fallback_tickers", self.consultas[fonte], classe=self.classe, fonte=fonte)
+            registry.set_gauge("collector_source_completed_tickers", self.completou[fonte], classe=self.classe, fonte=fonte)
@@ -0,0 +1,85 @@
+# modules/yahoo.py
+# Chamadas ao Yahoo compartilhadas pelos processors: .info de um ticker e
+# yf.download multi-ticker em lotes. Throttle/timeout nunca viram "ticker sem
+# dados": .info deixa o erro subir e o download devolve esses tickers em
+# `indisponiveis` (modules/failures.py não conta nenhum dos dois como falha).
+from modules.pipeline import clean_tickers
+from modules.ratelimit import is_transient, limited
+
+DOWNLOAD_BATCH = 200  # tickers por chamada ao yf.download
+
+
+def sa(ticker):
+    # Símbolo da B3 no Yahoo
+    return ticker if ticker.upper().endswith(".SA") else ticker + ".SA"
+
+
+def info(simbolo):
+    # .info completo; erro que não é throttle/timeout conta como resposta vazia
+    import yfinance as yf
+
+    try:
+        with limited("yahoo", "info"):
+            return yf.Ticker(simbolo).info or {}
+    except Exception as e:
+        if is_transient(e):
+            raise
+        print(f"❌ Erro Yahoo {simbolo}: {e}")
+        return {}
+
+
+def download(tickers, simbolo=sa, indisponiveis=None, tamanho=DOWNLOAD_BATCH, **periodo):
+    # (ticker, DataFrame do yf.download) por ticker com dados. `indisponiveis`
+    # (set) recebe os tickers sem resposta: lote que falhou inteiro ou símbolo
+    # com throttle/timeout (yf.shared._ERRORS)
+    import pandas as pd
+    import yfinance as yf
+
+    if indisponiveis is None:
+        indisponiveis = set()
+    tickers = clean_tickers(tickers)
+    for start in range(0, len(tickers), tamanho):
+        lote = tickers[start:start + tamanho]
+        simbolos = {simbolo(t): t for t in lote}
+
+        try:
+            with limited("yahoo", "download"):
+                df = yf.download(
+                    list(simbolos), group_by="ticker",
+                    auto_adjust=True, threads=True, progress=False, **periodo,
+                )
+        except Exception as e:
+            print(f"❌ Erro no download em lote ({len(lote)} tickers): {e}")
+            indisponiveis.update(lote)
+            continue
+
+        erros = getattr(getattr(yf, "shared", None), "_ERRORS", None) or {}
+        indisponiveis.update(
+            ticker for s, ticker in simbolos.items()
+            if s in erros and is_transient(erros[s])
+        )
+        if df is None or df.empty:
+            continue
+
+        for s, ticker in simbolos.items():
+            if isinstance(df.columns, pd.MultiIndex):
+                if s not in df.columns.get_level_values(0):
+                    continue
+                sub = df[s]
+            else:
+                sub = df
+
+            sub = sub.dropna(how="all")
+            if not sub.empty:
+                yield ticker, sub
+
+
+def quote_many(tickers, simbolo=sa):
+    # Último pregão em lote (fallback de cotação, modules/sources.py):
+    # ({TICKER: {"Close": ..., "Volume": ...}}, {TICKER sem resposta})
+    sem_resposta = set()
+    quotes = {}
+    for ticker, sub in download(tickers, simbolo, sem_resposta, period="1d"):
+        linha = sub.iloc[-1]
+        quotes[ticker.upper()] = {c: float(v) for c, v in linha.items() if v == v}
+    return quotes, {t.upper() for t in sem_resposta}